@@ -1,6 +1,6 @@
 from fastapi import APIRouter, BackgroundTasks, HTTPException, Query, Depends, Body
-from fastapi.responses import StreamingResponse
-from typing import Optional
+from fastapi.responses import Response, StreamingResponse
+from typing import Callable, Optional
 import uuid
 import json
 
@@ -25,10 +25,17 @@ from app.models.schemas import (
 from app.core.jobs import create_job, get_job, set_job, is_job_canceled
 from app.core.logging import get_job_logger
 from app.services.ingest import ingest_repo
-from app.services.faiss_index import search_index, build_index, hybrid_search, keyword_search
+from app.services.faiss_index import (
+    search_index,
+    build_index,
+    hybrid_search,
+    keyword_search,
+    invalidate_repo as invalidate_search_index,
+)
 from app.services.chunking import build_chunks_from_docs
 from app.services.analysis import run_analysis
 from app.services.db import (
+    close_conn,
     read_summary,
     read_modules,
     read_repo_list,
@@ -72,6 +79,7 @@ from app.services.symbol_navigator import (
     get_symbol_callees,
     get_call_graph,
     get_file_outline,
+    invalidate_repo as invalidate_symbol_navigator,
 )
 from app.services.codebase_export import (
     export_codebase,
@@ -83,15 +91,23 @@ from app.services.learning_path import (
     get_learning_path,
     get_module_learning_path,
     find_entry_points,
+    invalidate_repo as invalidate_learning_path,
 )
 from app.services.mcp_generator import (
     generate_mcp_server_code,
     generate_cursor_mcp_config,
     generate_claude_desktop_config,
     save_mcp_server,
-    get_mcp_tools_list,
+    get_mcp_tools_json_bytes,
+    invalidate_mcp_cache,
+)
+from app.services.mcp_runtime import (
+    start_mcp_server,
+    stop_mcp_server,
+    get_mcp_status,
+    get_mcp_port,
+    release_mcp_port,
 )
-from app.services.mcp_runtime import start_mcp_server, stop_mcp_server, get_mcp_status
 from app.services.code_explain import (
     explain_code_snippet,
     explain_symbol,
@@ -111,6 +127,14 @@ def _estimate_tokens(text: str) -> int:
     return max(1, len(text) // 4)
 
 
+def _run_background_job(job: Callable[[], None]) -> None:
+    """执行后台任务，结束后关闭该线程持有的数据库连接"""
+    try:
+        job()
+    finally:
+        close_conn()
+
+
 @router.get("/health")
 def health():
     return {"status": "ok"}
@@ -170,7 +194,7 @@ def ingest_repo_endpoint(
             logger = get_job_logger(repo_id)
             logger.error("ingest_failed repo_id=%s error=%s", repo_id, exc)
 
-    background.add_task(run_ingest)
+    background.add_task(_run_background_job, run_ingest)
     return {"repo_id": repo_id, "job_id": job_id}
 
 
@@ -279,7 +303,7 @@ def retry_repo_job(
             logger = get_job_logger(repo_id)
             logger.error("ingest_retry_failed repo_id=%s error=%s", repo_id, exc)
 
-    background.add_task(run_retry)
+    background.add_task(_run_background_job, run_retry)
     return {"repo_id": repo_id, "job_id": job_id}
 
 
@@ -445,6 +469,7 @@ def update_repo_job(
 
             if incremental_ok and updated_docs:
                 insert_docs(repo_id, updated_docs)
+                invalidate_learning_path(repo_id)
             else:
                 # Fallback to full analysis when incremental update not possible or unsafe
                 run_analysis(
@@ -471,7 +496,7 @@ def update_repo_job(
             logger = get_job_logger(repo_id)
             logger.error("ingest_update_failed repo_id=%s error=%s", repo_id, exc)
 
-    background.add_task(run_update)
+    background.add_task(_run_background_job, run_update)
     return {"repo_id": repo_id, "job_id": job_id}
 
 
@@ -484,6 +509,11 @@ def delete_repo_endpoint(repo_id: str, user: dict = Depends(get_current_user)):
 
     # Delete database records
     delete_repo(repo_id)
+    invalidate_learning_path(repo_id)
+    invalidate_symbol_navigator(repo_id)
+    invalidate_mcp_cache(repo_id)
+    invalidate_search_index(repo_id)
+    release_mcp_port(repo_id)
 
     # Remove workspace artifacts
     base_dir = Path(__file__).resolve().parents[2] / "workspace"
@@ -884,8 +914,8 @@ def repo_symbol_detail(repo_id: str, symbol_id: str):
         "line_end": location.line_end,
         "signature": location.signature,
         "references": [{"file_path": r.file_path, "line": r.line, "edge_type": r.edge_type} for r in references],
-        "callers": callers,
-        "callees": callees,
+        "callers": [c._asdict() for c in callers],
+        "callees": [c._asdict() for c in callees],
     }
 
 
@@ -1018,7 +1048,7 @@ def repo_entry_points(repo_id: str):
 @router.get("/repos/{repo_id}/mcp/tools")
 def repo_mcp_tools(repo_id: str):
     """获取 MCP 工具列表"""
-    return {"tools": get_mcp_tools_list()}
+    return Response(content=get_mcp_tools_json_bytes(), media_type="application/json")
 
 
 @router.get("/repos/{repo_id}/mcp/server-code")
@@ -1031,9 +1061,8 @@ def repo_mcp_server_code(repo_id: str):
 @router.get("/repos/{repo_id}/mcp/cursor-config")
 def repo_mcp_cursor_config(repo_id: str):
     """获取 Cursor MCP 配置（SSE 远程连接模式）"""
-    # 获取或分配端口
-    status = get_mcp_status(repo_id)
-    port = status.get("port") or 9100
+    # 只需要端口：读注册表即可，不必做完整的状态检查
+    port = get_mcp_port(repo_id) or 9100
     config = generate_cursor_mcp_config(repo_id, port=port, host="localhost")
     return {"config": config}
 
@@ -1041,8 +1070,7 @@ def repo_mcp_cursor_config(repo_id: str):
 @router.get("/repos/{repo_id}/mcp/claude-config")
 def repo_mcp_claude_config(repo_id: str):
     """获取 Claude Desktop MCP 配置（SSE 远程连接模式）"""
-    status = get_mcp_status(repo_id)
-    port = status.get("port") or 9100
+    port = get_mcp_port(repo_id) or 9100
     config = generate_claude_desktop_config(repo_id, port=port, host="localhost")
     return {"config": config}
 
@@ -1079,8 +1107,7 @@ def repo_mcp_generate(repo_id: str, force: bool = False):
         }
     
     # 文件已存在，返回现有信息
-    status = get_mcp_status(repo_id)
-    port = status.get("port") or 9100
+    port = get_mcp_port(repo_id) or 9100
     return {
         "status": "exists",
         "files": {"server_file": str(server_file)},
@@ -2,13 +2,17 @@ from __future__ import annotations
 
 from dataclasses import asdict
 from typing import Dict, List, Tuple
+import sys
 import time
 from pathlib import Path
 
 from app.services.parsers import Symbol
 from app.services.module_tree_codewiki import module_tree_from_codewiki
 from app.services.chunking import build_chunks_from_docs
-from app.services.faiss_index import build_index
+from app.services.faiss_index import build_index, invalidate_repo as invalidate_search_index
+from app.services.learning_path import invalidate_repo as invalidate_learning_path
+from app.services.mcp_generator import invalidate_mcp_cache
+from app.services.symbol_navigator import invalidate_repo as invalidate_symbol_navigator
 from app.services.db import (
     upsert_repo,
     insert_files,
@@ -37,6 +41,10 @@ def _symbols_from_codewiki(symbols_data: List[Dict]) -> Tuple[List[Tuple[str, Sy
     for sym in symbols_data:
         sid = sym["id"]
         sym_payload = {k: v for k, v in sym.items() if k != "id"}
+        # kind 取值很少、file_path 按文件重复，JSON 解析出的每个都是新字符串，驻留后共享同一对象
+        for key in ("kind", "file_path"):
+            if isinstance(sym_payload.get(key), str):
+                sym_payload[key] = sys.intern(sym_payload[key])
         sym_obj = Symbol(**sym_payload)
         symbol_pairs.append((sid, sym_obj))
         symbol_map[sid] = sym_obj
@@ -309,6 +317,10 @@ def run_analysis(
     update_progress(95, "数据保存完成", "正在完成最后的清理工作...")
     ensure_not_canceled()
     insert_docs(repo_id, docs_payloads)
+    invalidate_learning_path(repo_id)
+    invalidate_symbol_navigator(repo_id)
+    invalidate_mcp_cache(repo_id)
+    invalidate_search_index(repo_id)
 
     logger.info("analysis_complete repo_id=%s", repo_id)
 
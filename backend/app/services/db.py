@@ -1,18 +1,27 @@
 from __future__ import annotations
 
+import atexit
 import hashlib
+import os
 import uuid
 import json
 import sqlite3
+import threading
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
 from urllib.parse import urlparse
 
 from app.services.module_tree import ModuleNode
 
 
 def _db_path() -> Path:
+    # CODEWIKI_DB_PATH 可把数据库指向其他位置（测试用临时目录）
+    override = os.getenv("CODEWIKI_DB_PATH")
+    if override:
+        path = Path(override)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
     root = Path(__file__).resolve().parents[2] / "workspace"
     root.mkdir(parents=True, exist_ok=True)
     return root / "analysis.db"
@@ -26,13 +35,74 @@ def _hash(value: str) -> str:
     return hashlib.sha1(value.encode("utf-8")).hexdigest()
 
 
+_CONN_POOL = threading.local()
+_OPEN_CONNS: Dict[int, sqlite3.Connection] = {}  # id(conn) -> conn，进程退出时统一关闭
+_OPEN_CONNS_LOCK = threading.Lock()
+_INIT_LOCK = threading.Lock()
+_INIT_DONE: Set[Path] = set()  # 已建表的数据库路径
+
+
 def get_conn() -> sqlite3.Connection:
-    conn = sqlite3.connect(_db_path())
-    conn.row_factory = sqlite3.Row
+    """
+    Return this thread's pooled connection, opening it on first use.
+
+    连接数受线程数约束（请求线程池大小 + 后台任务线程）；后台任务结束时应调用 close_conn() 释放。
+    数据库路径变化（如测试切换 CODEWIKI_DB_PATH）时重新打开。
+    """
+    path = _db_path()
+    conn = getattr(_CONN_POOL, "conn", None)
+    if conn is not None and _CONN_POOL.path != path:
+        close_conn()
+        conn = None
+    if conn is None:
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _CONN_POOL.conn = conn
+        _CONN_POOL.path = path
+        with _OPEN_CONNS_LOCK:
+            _OPEN_CONNS[id(conn)] = conn
     return conn
 
 
+def close_conn() -> None:
+    """关闭当前线程的连接（后台任务结束时调用），下次 get_conn() 会重新打开"""
+    conn = getattr(_CONN_POOL, "conn", None)
+    if conn is None:
+        return
+    _CONN_POOL.conn = None
+    with _OPEN_CONNS_LOCK:
+        _OPEN_CONNS.pop(id(conn), None)
+    conn.close()
+
+
+def _close_all_conns() -> None:
+    with _OPEN_CONNS_LOCK:
+        conns = list(_OPEN_CONNS.values())
+        _OPEN_CONNS.clear()
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+atexit.register(_close_all_conns)
+
+
 def init_db() -> None:
+    path = _db_path()
+    if path in _INIT_DONE:
+        return
+    with _INIT_LOCK:
+        if path in _INIT_DONE:
+            return
+        _init_schema()
+        _INIT_DONE.add(path)
+
+
+def _init_schema() -> None:
     schema_path = Path(__file__).resolve().parents[2] / "db" / "schema_sqlite.sql"
     with get_conn() as conn:
         conn.executescript(schema_path.read_text(encoding="utf-8"))
@@ -852,6 +922,35 @@ def read_symbol_by_id(repo_id: str, symbol_id: str) -> Optional[Dict]:
     return dict(row)
 
 
+# SQLite 单条语句的绑定参数个数有上限（旧版本为 999），IN 查询按批拆分
+_IN_BATCH = 900
+
+
+def read_symbols_by_ids(repo_id: str, symbol_ids: List[str]) -> Dict[str, Dict]:
+    """根据一组ID批量获取符号，返回 {symbol_id: 符号}，不存在的ID不出现在结果中"""
+    unique_ids = list(dict.fromkeys(symbol_ids))
+    if not unique_ids:
+        return {}
+    init_db()
+    result: Dict[str, Dict] = {}
+    with get_conn() as conn:
+        for start in range(0, len(unique_ids), _IN_BATCH):
+            batch = unique_ids[start:start + _IN_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"""
+                SELECT s.id, s.kind, s.name, s.signature, s.container, s.line_start, s.line_end, f.path as file_path
+                FROM symbols s
+                JOIN files f ON s.file_id = f.id
+                WHERE s.repo_id=? AND s.id IN ({placeholders})
+                """,
+                (repo_id, *batch),
+            ).fetchall()
+            for row in rows:
+                result[row["id"]] = dict(row)
+    return result
+
+
 def read_symbols_by_repo(repo_id: str) -> List[Dict]:
     """获取仓库中的所有符号"""
     init_db()
@@ -869,6 +968,35 @@ def read_symbols_by_repo(repo_id: str) -> List[Dict]:
     return [dict(r) for r in rows]
 
 
+class SymbolRow(NamedTuple):
+    """精简的符号行，供遍历全部符号的热点循环使用（属性访问，字段已规范化）"""
+    file_path: str
+    kind: str
+    name: str
+    name_lower: str
+
+
+def read_symbol_rows_by_repo(repo_id: str) -> List[SymbolRow]:
+    """获取仓库中的所有符号（SymbolRow 形式，顺序与 read_symbols_by_repo 一致）"""
+    init_db()
+    with get_conn() as conn:
+        rows = conn.execute(
+            """
+            SELECT f.path as file_path, s.kind, s.name
+            FROM symbols s
+            JOIN files f ON s.file_id = f.id
+            WHERE s.repo_id=?
+            ORDER BY f.path, s.line_start
+            """,
+            (repo_id,),
+        ).fetchall()
+    result: List[SymbolRow] = []
+    for file_path, kind, name in rows:
+        name = name or ""
+        result.append(SymbolRow(file_path or "", kind or "", name, name.lower()))
+    return result
+
+
 def read_symbol_edges(repo_id: str) -> List[Dict]:
     """获取符号依赖边"""
     init_db()
@@ -1,6 +1,9 @@
 ﻿from __future__ import annotations
 
+import os
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, Iterable, List, Tuple
 
@@ -25,7 +28,8 @@ def _parse_imports(path: str, language: str) -> List[ImportRef]:
     return imports
 
 
-def _python_import_to_path(module: str, root: Path) -> str | None:
+@lru_cache(maxsize=None)
+def _python_import_to_path(module: str, root_str: str) -> str | None:
     if not module:
         return None
     # import x.y -> x/y.py or x/y/__init__.py
@@ -35,6 +39,7 @@ def _python_import_to_path(module: str, root: Path) -> str | None:
     if parts and parts[0] == "from":
         module = parts[1]
     module = module.replace(".", "/")
+    root = Path(root_str)
     candidate = root / f"{module}.py"
     if candidate.exists():
         return str(candidate)
@@ -44,39 +49,56 @@ def _python_import_to_path(module: str, root: Path) -> str | None:
     return None
 
 
-def _java_import_to_path(module: str, root: Path) -> str | None:
+@lru_cache(maxsize=None)
+def _java_import_to_path(module: str, root_str: str) -> str | None:
     if not module:
         return None
     # import com.a.B; -> com/a/B.java
     module = module.replace("import", "").replace(";", "").strip()
     module = module.replace(".", "/")
-    candidate = root / f"{module}.java"
+    candidate = Path(root_str) / f"{module}.java"
     if candidate.exists():
         return str(candidate)
     return None
 
 
+def _parse_and_resolve(file_path: str, language: str, repo_root: str) -> List[Tuple[str, str, str, str]]:
+    # Runs in a worker process: return plain tuples, they pickle cheaper than dataclasses.
+    resolved: List[Tuple[str, str, str, str]] = []
+    for imp in _parse_imports(file_path, language):
+        if language == "python":
+            dst = _python_import_to_path(imp.module, repo_root)
+        else:
+            dst = _java_import_to_path(imp.module, repo_root)
+        if dst is None:
+            continue
+        resolved.append((file_path, dst, "import", imp.module))
+    return resolved
+
+
+def _parse_wrapper(args: Tuple[str, str, str]) -> List[Tuple[str, str, str, str]]:
+    return _parse_and_resolve(*args)
+
+
 def build_file_dependencies(files: Iterable[Tuple[str, str]], repo_root: str) -> List[FileDependency]:
-    root = Path(repo_root)
+    # Resolution results are only valid for the current file system state.
+    _python_import_to_path.cache_clear()
+    _java_import_to_path.cache_clear()
+    repo_root = str(repo_root)
+    tasks = [(file_path, language, repo_root) for file_path, language in files]
     edges: List[FileDependency] = []
+    if not tasks:
+        return edges
+
+    # Parsing is CPU-bound and independent per file; only pay the pool start-up for larger batches.
+    if len(tasks) < 32:
+        results = map(_parse_wrapper, tasks)
+    else:
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            results = list(executor.map(_parse_wrapper, tasks, chunksize=32))
 
-    for file_path, language in files:
-        imports = _parse_imports(file_path, language)
-        for imp in imports:
-            if language == "python":
-                dst = _python_import_to_path(imp.module, root)
-            else:
-                dst = _java_import_to_path(imp.module, root)
-
-            if dst is None:
-                continue
-            edges.append(
-                FileDependency(
-                    src=file_path,
-                    dst=dst,
-                    edge_type="import",
-                    detail=imp.module,
-                )
-            )
+    for resolved in results:
+        for src, dst, edge_type, detail in resolved:
+            edges.append(FileDependency(src=src, dst=dst, edge_type=edge_type, detail=detail))
 
     return edges
@@ -1,7 +1,8 @@
 ﻿from __future__ import annotations
 
 import json
-from typing import Dict, List
+from collections import defaultdict
+from typing import Dict, List, Tuple
 
 from app.services.db import get_conn, init_db, read_file_edges
 
@@ -43,23 +44,17 @@ def read_module_edges(repo_id: str) -> List[Dict]:
         for f in file_ids:
             file_to_module[f] = module_id
 
-    file_deps = read_file_deps(repo_id)
-
-    counts: Dict[str, int] = {}
-    for dep in file_deps:
-        src = dep.get("src")
-        dst = dep.get("dst")
+    counts: Dict[Tuple[str, str], int] = defaultdict(int)
+    for dep in read_file_deps(repo_id):
+        # read_file_edges rows carry src_path/dst_path; accept the short keys as well.
+        src = dep.get("src_path") or dep.get("src")
+        dst = dep.get("dst_path") or dep.get("dst")
         if not src or not dst:
             continue
         src_module = file_to_module.get(src)
         dst_module = file_to_module.get(dst)
         if not src_module or not dst_module or src_module == dst_module:
             continue
-        key = f"{src_module}->{dst_module}"
-        counts[key] = counts.get(key, 0) + 1
+        counts[(src_module, dst_module)] += 1
 
-    edges = []
-    for key, count in counts.items():
-        src, dst = key.split("->", 1)
-        edges.append({"src": src, "dst": dst, "count": count})
-    return edges
+    return [{"src": src, "dst": dst, "count": count} for (src, dst), count in counts.items()]
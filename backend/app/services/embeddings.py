@@ -3,7 +3,8 @@
 import hashlib
 import json
 import os
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import requests
 import numpy as np
 
@@ -60,6 +61,33 @@ def _build_embeddings_url(base_url: str) -> str:
     return base + "/v1/embeddings"
 
 
+_EMBED_BATCH_SIZE = 64
+_EMBED_MAX_WORKERS = 4
+
+
+def _batched(iterable: Iterable[str], n: int) -> Iterator[List[str]]:
+    batch: List[str] = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == n:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _post_batch(url: str, headers: Dict[str, str], model: str, batch: List[str]) -> Tuple[List[List[float]], Dict]:
+    """Embed one batch; returns vectors in input order plus the provider usage block."""
+    payload = {"model": model, "input": batch}
+    resp = requests.post(url, headers=headers, data=json.dumps(payload), timeout=60)
+    resp.raise_for_status()
+    data = resp.json()
+    items = data.get("data", [])
+    if all("index" in item for item in items):
+        items = sorted(items, key=lambda item: item["index"])
+    return [item["embedding"] for item in items], data.get("usage") or {}
+
+
 def embed_texts(texts: List[str], repo_id: Optional[str] = None) -> List[List[float]]:
     """Generate embeddings for texts.
     
@@ -80,17 +108,27 @@ def embed_texts(texts: List[str], repo_id: Optional[str] = None) -> List[List[fl
 
     url = _build_embeddings_url(base_url)
     headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-    payload = {"model": model, "input": texts}
-    resp = requests.post(url, headers=headers, data=json.dumps(payload), timeout=60)
-    resp.raise_for_status()
-    data = resp.json()
+    batches = list(_batched(texts, _EMBED_BATCH_SIZE))
+    if len(batches) <= 1:
+        results = [_post_batch(url, headers, model, batch) for batch in batches]
+    else:
+        # Network-bound: keep a few batches in flight; map() preserves batch order.
+        with ThreadPoolExecutor(max_workers=min(_EMBED_MAX_WORKERS, len(batches))) as executor:
+            results = list(executor.map(lambda batch: _post_batch(url, headers, model, batch), batches))
+
+    vectors: List[List[float]] = []
+    prompt_tokens = 0
+    total_tokens = 0
+    for batch_vectors, usage in results:
+        vectors.extend(batch_vectors)
+        if usage:
+            batch_prompt = int(usage.get("prompt_tokens") or 0)
+            prompt_tokens += batch_prompt
+            total_tokens += int(usage.get("total_tokens") or batch_prompt)
     # Token usage tracking
     try:
         from app.services.db import record_token_usage
-        usage = data.get("usage") or {}
-        if usage:
-            prompt_tokens = int(usage.get("prompt_tokens") or 0)
-            total_tokens = int(usage.get("total_tokens") or prompt_tokens)
+        if prompt_tokens or total_tokens:
             record_token_usage(
                 repo_id,
                 kind="embedding",
@@ -102,4 +140,4 @@ def embed_texts(texts: List[str], repo_id: Optional[str] = None) -> List[List[fl
             )
     except Exception:
         pass
-    return [item["embedding"] for item in data.get("data", [])]
+    return vectors
@@ -1,12 +1,18 @@
 ﻿from __future__ import annotations
 
-import json
+import hashlib
+import heapq
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
 from dataclasses import dataclass, asdict
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Tuple
 
 import faiss
 import numpy as np
+import orjson
 
 from app.services.chunking import Chunk
 from app.services.citations import Citation
@@ -25,161 +31,442 @@ def _index_dir(repo_id: str) -> Path:
     return root
 
 
-def _load_metadata_vectors(repo_id: str) -> dict:
+def _load_vectors_f16(index_dir: Path, count: int) -> np.ndarray | None:
+    vectors_path = index_dir / "vectors.f16"
+    if count <= 0 or not vectors_path.exists():
+        return None
+    size = vectors_path.stat().st_size
+    itemsize = np.dtype(np.float16).itemsize
+    if size == 0 or size % (count * itemsize):
+        return None
+    return np.memmap(vectors_path, dtype=np.float16, mode="r", shape=(count, size // (count * itemsize)))
+
+
+def _load_metadata_vectors(repo_id: str) -> Tuple[dict, np.ndarray | None]:
+    """Map chunk id -> {"text", "row"} where row indexes the returned (memory-mapped) vector array."""
     index_dir = _index_dir(repo_id)
     meta_path = index_dir / "metadata.jsonl"
     if not meta_path.exists():
-        return {}
-    items: dict = {}
-    with meta_path.open("r", encoding="utf-8") as handle:
+        return {}, None
+    records: List[dict] = []
+    with meta_path.open("rb") as handle:
         for line in handle:
             try:
-                record = json.loads(line)
+                records.append(orjson.loads(line))
             except Exception:
-                continue
-            chunk_id = record.get("id")
-            text = record.get("text")
+                records.append({})
+    # Vectors live in vectors.f16 (row i <-> line i); older indexes inline them in the jsonl.
+    stored = _load_vectors_f16(index_dir, len(records))
+    legacy: List[list] = []
+    items: dict = {}
+    for row, record in enumerate(records):
+        chunk_id = record.get("id")
+        text = record.get("text")
+        if not chunk_id or not text:
+            continue
+        if stored is None:
             vector = record.get("vector")
-            if chunk_id and text and isinstance(vector, list):
-                items[chunk_id] = {"text": text, "vector": vector}
-    return items
+            if not isinstance(vector, list) or not vector:
+                continue
+            row = len(legacy)
+            legacy.append(vector)
+        items[chunk_id] = {"text": text, "row": row}
+    if stored is None and legacy:
+        try:
+            stored = np.array(legacy, dtype=np.float32)
+        except ValueError:
+            return {}, None
+    return items, stored
+
+
+# CJK text has no word boundaries, so each ideograph becomes its own term.
+_TOKEN_RE = re.compile(r"[\u4e00-\u9fff]|[^\W\u4e00-\u9fff]+")
+_BM25_K1 = 1.5
+_BM25_B = 0.75
+
+
+def _tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _build_postings(texts: List[str]) -> dict:
+    """
+    Inverted index over chunk texts for BM25.
+
+    Postings of term i are doc_ids/tfs[offsets[i]:offsets[i + 1]]; everything is a plain
+    numpy array so postings.bin loads without pickle.
+    """
+    term_ids: Dict[str, int] = {}
+    term_postings: List[List[Tuple[int, int]]] = []
+    doc_lens: List[int] = []
+    for doc_idx, text in enumerate(texts):
+        tokens = _tokenize(text)
+        doc_lens.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            term_idx = term_ids.setdefault(term, len(term_postings))
+            if term_idx == len(term_postings):
+                term_postings.append([])
+            term_postings[term_idx].append((doc_idx, tf))
+    offsets = np.zeros(len(term_postings) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(entries) for entries in term_postings])
+    flat = [entry for entries in term_postings for entry in entries]
+    pairs = np.array(flat, dtype=np.int32).reshape(-1, 2)
+    return {
+        "terms": term_ids,
+        "offsets": offsets,
+        "doc_ids": pairs[:, 0].copy(),
+        "tfs": pairs[:, 1].copy(),
+        "doc_lens": np.array(doc_lens, dtype=np.int32),
+        "avgdl": (sum(doc_lens) / len(doc_lens)) if doc_lens else 0.0,
+    }
+
+
+def _save_postings(path: Path, postings_data: dict) -> None:
+    terms = np.array(list(postings_data["terms"]), dtype=np.str_)
+    with path.open("wb") as handle:
+        np.savez(
+            handle,
+            terms=terms,
+            offsets=postings_data["offsets"],
+            doc_ids=postings_data["doc_ids"],
+            tfs=postings_data["tfs"],
+            doc_lens=postings_data["doc_lens"],
+        )
+
+
+def _load_postings(repo_id: str) -> dict | None:
+    postings_path = _index_dir(repo_id) / "postings.bin"
+    if not postings_path.exists():
+        return None
+    try:
+        # allow_pickle=False: postings written by older builds were pickles and are ignored (legacy scan)
+        with np.load(postings_path, allow_pickle=False) as data:
+            doc_lens = data["doc_lens"]
+            return {
+                "terms": {term: idx for idx, term in enumerate(data["terms"].tolist())},
+                "offsets": data["offsets"],
+                "doc_ids": data["doc_ids"],
+                "tfs": data["tfs"],
+                "doc_lens": doc_lens,
+                "avgdl": float(doc_lens.mean()) if doc_lens.size else 0.0,
+            }
+    except Exception:
+        return None
+
+
+def _bm25_scores(postings_data: dict, query_terms: List[str]) -> Dict[int, float]:
+    terms = postings_data["terms"]
+    offsets = postings_data["offsets"]
+    doc_ids = postings_data["doc_ids"]
+    tfs = postings_data["tfs"]
+    doc_lens = postings_data["doc_lens"]
+    avgdl = postings_data["avgdl"] or 1.0
+    n_docs = len(doc_lens)
+    scores: Dict[int, float] = {}
+    for term in set(query_terms):
+        term_idx = terms.get(term)
+        if term_idx is None:
+            continue
+        start, end = int(offsets[term_idx]), int(offsets[term_idx + 1])
+        df = end - start
+        idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+        term_docs = doc_ids[start:end]
+        term_tfs = tfs[start:end].astype(np.float64)
+        norm = term_tfs + _BM25_K1 * (1.0 - _BM25_B + _BM25_B * doc_lens[term_docs] / avgdl)
+        for doc_idx, score in zip(term_docs.tolist(), (idf * term_tfs * (_BM25_K1 + 1.0) / norm).tolist()):
+            scores[doc_idx] = scores.get(doc_idx, 0.0) + score
+    return scores
+
+
+def _faiss_id(chunk_id: str) -> int:
+    """Stable non-negative int64 id for a chunk, so FAISS entries survive re-ordering."""
+    digest = hashlib.blake2b(chunk_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") & 0x7FFF_FFFF_FFFF_FFFF
+
+
+def _load_id_index(index_path: Path, dim: int):
+    if not index_path.exists():
+        return None
+    try:
+        index = faiss.read_index(str(index_path))
+    except Exception:
+        return None
+    # Indexes written before ids were introduced are plain IndexFlatIP: rebuild those.
+    if not isinstance(index, faiss.IndexIDMap2) or index.d != dim:
+        return None
+    return index
+
+
+def _embed_checked(texts: List[str], repo_id: str) -> List[List[float]]:
+    vectors = embed_texts(texts, repo_id=repo_id)
+    # A short response would otherwise surface as an IndexError/shape error deep inside build_index.
+    if len(vectors) != len(texts) or not len(vectors[0]):
+        raise ValueError(f"embed_texts returned {len(vectors)} vectors for {len(texts)} texts")
+    return vectors
 
 
 def build_index(repo_id: str, chunks: List[Chunk]) -> None:
     if not chunks:
         return
-    prev = _load_metadata_vectors(repo_id)
-    vectors: List[List[float]] = []
+    prev, prev_arr = _load_metadata_vectors(repo_id)
+    cached_rows: List[Tuple[int, int]] = []
     to_embed_texts: List[str] = []
     to_embed_indices: List[int] = []
+    reused_ids = set()
 
     for idx, chunk in enumerate(chunks):
         cached = prev.get(chunk.id)
         if cached and cached.get("text") == chunk.text:
-            vectors.append(cached["vector"])
+            cached_rows.append((idx, cached["row"]))
+            reused_ids.add(chunk.id)
         else:
             to_embed_indices.append(idx)
             to_embed_texts.append(chunk.text)
-            vectors.append([])  # placeholder
 
-    if to_embed_texts:
-        new_vectors = embed_texts(to_embed_texts, repo_id=repo_id)
-        for i, vec in enumerate(new_vectors):
-            vectors[to_embed_indices[i]] = vec
+    new_vectors = _embed_checked(to_embed_texts, repo_id) if to_embed_texts else []
+    if cached_rows and new_vectors and len(new_vectors[0]) != prev_arr.shape[1]:
+        # Embedding model changed dimension: cached vectors are unusable.
+        cached_rows, reused_ids = [], set()
+        to_embed_indices = list(range(len(chunks)))
+        new_vectors = _embed_checked([chunk.text for chunk in chunks], repo_id)
 
-    arr = np.array(vectors, dtype="float32")
+    dim = prev_arr.shape[1] if cached_rows else len(new_vectors[0])
+    arr = np.empty((len(chunks), dim), dtype=np.float32)
+    if cached_rows:
+        dst_rows, src_rows = zip(*cached_rows)
+        arr[list(dst_rows)] = prev_arr[list(src_rows)]
+    # Release the memory map before vectors.f16 is rewritten below.
+    prev_arr = None
+    if to_embed_indices:
+        arr[to_embed_indices] = np.asarray(new_vectors, dtype=np.float32)
     faiss.normalize_L2(arr)
-
-    index = faiss.IndexFlatIP(arr.shape[1])
-    index.add(arr)
+    ids = np.array([_faiss_id(chunk.id) for chunk in chunks], dtype=np.int64)
 
     index_dir = _index_dir(repo_id)
-    faiss.write_index(index, str(index_dir / "index.faiss"))
-
-    meta_path = index_dir / "metadata.jsonl"
-    with meta_path.open("w", encoding="utf-8") as handle:
-        for chunk, vec in zip(chunks, vectors):
-            record = {
-                "id": chunk.id,
-                "text": chunk.text,
-                "citations": [asdict(c) for c in chunk.citations],
-                "vector": vec,
-            }
-            handle.write(json.dumps(record) + "\n")
+    index_path = index_dir / "index.faiss"
+    index = _load_id_index(index_path, arr.shape[1]) if prev else None
+    if index is not None:
+        # Only touch the delta: drop vanished/changed chunks, add the freshly embedded ones.
+        stale_ids = np.array([_faiss_id(cid) for cid in prev.keys() - reused_ids], dtype=np.int64)
+        if stale_ids.size:
+            index.remove_ids(faiss.IDSelectorBatch(stale_ids))
+        if to_embed_indices:
+            index.add_with_ids(arr[to_embed_indices], ids[to_embed_indices])
+        if index.ntotal != len(chunks):
+            index = None
+    if index is None:
+        index = faiss.IndexIDMap2(faiss.IndexFlatIP(arr.shape[1]))
+        index.add_with_ids(arr, ids)
 
+    faiss.write_index(index, str(index_path))
+    # Half precision is plenty for reusing cached embeddings and halves the bytes on disk.
+    arr.astype(np.float16).tofile(index_dir / "vectors.f16")
 
-def search_index(repo_id: str, query: str, top_k: int = 8) -> List[SearchHit]:
-    index_dir = _index_dir(repo_id)
-    index_path = index_dir / "index.faiss"
     meta_path = index_dir / "metadata.jsonl"
-    if not index_path.exists() or not meta_path.exists():
-        return []
+    records = (
+        {
+            "id": chunk.id,
+            "text": chunk.text,
+            "citations": [asdict(c) for c in chunk.citations],
+        }
+        for chunk in chunks
+    )
+    with meta_path.open("wb") as handle:
+        handle.write(b"\n".join(orjson.dumps(record) for record in records) + b"\n")
 
-    index = faiss.read_index(str(index_path))
-    query_vec = np.array(embed_texts([query], repo_id=repo_id), dtype="float32")
-    faiss.normalize_L2(query_vec)
+    _save_postings(index_dir / "postings.bin", _build_postings([chunk.text for chunk in chunks]))
 
-    scores, ids = index.search(query_vec, top_k)
 
+def _read_metadata(meta_path: Path) -> List[dict]:
+    # Unparseable lines keep their slot so row numbers stay aligned with the FAISS ids.
     metadata: List[dict] = []
-    with meta_path.open("r", encoding="utf-8") as handle:
+    with meta_path.open("rb") as handle:
         for line in handle:
-            metadata.append(json.loads(line))
+            try:
+                metadata.append(orjson.loads(line))
+            except Exception:
+                metadata.append({})
+    return metadata
 
-    hits: List[SearchHit] = []
-    for rank, idx in enumerate(ids[0].tolist()):
-        if idx < 0 or idx >= len(metadata):
-            continue
-        record = metadata[idx]
+
+class RepoIndex:
+    """FAISS index, chunk metadata and keyword postings of one repo, loaded once and shared by searches."""
+
+    def __init__(self, repo_id: str):
+        index_dir = _index_dir(repo_id)
+        index_path = index_dir / "index.faiss"
+        self.repo_id = repo_id
+        self.index = faiss.read_index(str(index_path)) if index_path.exists() else None
+        self.metadata = _read_metadata(index_dir / "metadata.jsonl")
+        self.postings = _load_postings(repo_id)
+        # IndexIDMap2 returns chunk-derived ids; legacy flat indexes return row numbers.
+        self._row_by_id: Dict[int, int] | None = None
+        if isinstance(self.index, faiss.IndexIDMap2):
+            self._row_by_id = {
+                _faiss_id(record["id"]): row for row, record in enumerate(self.metadata) if record.get("id")
+            }
+
+    def _hit(self, idx: int, score: float) -> SearchHit | None:
+        if idx < 0 or idx >= len(self.metadata):
+            return None
+        record = self.metadata[idx]
         citations = record.get("citations", [])
         chunk = Chunk(
             id=record.get("id", ""),
             text=record.get("text", ""),
             citations=[Citation(**c) for c in citations],
         )
-        hits.append(SearchHit(chunk=chunk, score=float(scores[0][rank])))
+        return SearchHit(chunk=chunk, score=score)
 
-    return hits
+    def semantic(self, query: str, top_k: int = 8) -> List[SearchHit]:
+        if self.index is None:
+            return []
+        query_vec = np.array(embed_texts([query], repo_id=self.repo_id), dtype="float32")
+        faiss.normalize_L2(query_vec)
+
+        scores, ids = self.index.search(query_vec, top_k)
+
+        hits: List[SearchHit] = []
+        for rank, idx in enumerate(ids[0].tolist()):
+            if self._row_by_id is not None:
+                idx = self._row_by_id.get(idx, -1)
+            hit = self._hit(idx, float(scores[0][rank]))
+            if hit is not None:
+                hits.append(hit)
+        return hits
+
+    def keyword(self, query: str, top_k: int = 8) -> List[SearchHit]:
+        if self.postings is None:
+            # 旧索引没有 postings.bin，退回线性扫描
+            return _keyword_scan(self.metadata, query, top_k)
+
+        scores = _bm25_scores(self.postings, _tokenize(query))
+        if not scores:
+            return []
+        ranked = heapq.nlargest(top_k, scores.items(), key=lambda x: x[1])
+
+        hits: List[SearchHit] = []
+        for doc_idx, score in ranked:
+            hit = self._hit(doc_idx, score)
+            if hit is not None:
+                hits.append(hit)
+        return hits
+
+
+def _file_stamp(path: Path) -> Tuple[int, int]:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return (0, -1)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+# repo_id -> (文件戳, RepoIndex)；每个仓库只保留最新的一份，文件戳变化时整项替换
+_REPO_INDEXES: "OrderedDict[str, Tuple[Tuple[Tuple[int, int], ...], RepoIndex]]" = OrderedDict()
+_REPO_INDEXES_LOCK = threading.Lock()
+_REPO_INDEXES_MAX = 16
+
+
+def load_repo_index(repo_id: str) -> RepoIndex | None:
+    """Return the shared RepoIndex for repo_id; rebuilt whenever build_index rewrites the files."""
+    index_dir = _index_dir(repo_id)
+    meta_path = index_dir / "metadata.jsonl"
+    if not meta_path.exists():
+        return None
+    stamps = tuple(
+        _file_stamp(index_dir / name) for name in ("index.faiss", "metadata.jsonl", "postings.bin")
+    )
+    with _REPO_INDEXES_LOCK:
+        cached = _REPO_INDEXES.get(repo_id)
+        if cached is not None and cached[0] == stamps:
+            _REPO_INDEXES.move_to_end(repo_id)
+            return cached[1]
+    repo_index = RepoIndex(repo_id)
+    with _REPO_INDEXES_LOCK:
+        _REPO_INDEXES[repo_id] = (stamps, repo_index)
+        _REPO_INDEXES.move_to_end(repo_id)
+        while len(_REPO_INDEXES) > _REPO_INDEXES_MAX:
+            _REPO_INDEXES.popitem(last=False)
+    return repo_index
+
+
+def invalidate_repo(repo_id: str) -> None:
+    """仓库删除或重建索引后调用，释放已加载的 FAISS 索引和元数据"""
+    with _REPO_INDEXES_LOCK:
+        _REPO_INDEXES.pop(repo_id, None)
+
+
+def search_index(repo_id: str, query: str, top_k: int = 8) -> List[SearchHit]:
+    repo_index = load_repo_index(repo_id)
+    if repo_index is None:
+        return []
+    return repo_index.semantic(query, top_k)
 
 
 def keyword_search(repo_id: str, query: str, top_k: int = 8) -> List[SearchHit]:
     """
-    关键词搜索 - 基于简单的字符串匹配
-    
+    关键词搜索 - 基于倒排索引的 BM25 打分
+
     Args:
         repo_id: 仓库ID
         query: 查询字符串
         top_k: 返回结果数
-        
+
     Returns:
         List[SearchHit]: 搜索结果
     """
-    index_dir = _index_dir(repo_id)
-    meta_path = index_dir / "metadata.jsonl"
-    if not meta_path.exists():
+    repo_index = load_repo_index(repo_id)
+    if repo_index is None:
         return []
-    
+    return repo_index.keyword(query, top_k)
+
+
+def _keyword_scan(metadata: List[dict], query: str, top_k: int) -> List[SearchHit]:
     query_lower = query.lower()
     query_terms = query_lower.split()
     
-    metadata: List[dict] = []
-    with meta_path.open("r", encoding="utf-8") as handle:
-        for line in handle:
-            try:
-                metadata.append(json.loads(line))
-            except Exception:
-                continue
-    
-    # 计算每个文档的关键词匹配分数
+    if not metadata:
+        return []
+
+    # 所有文档拼成一个缓冲区，每个词只扫描一遍，再按偏移量把命中分配回文档
+    texts = [record.get("text", "").lower() for record in metadata]
+    big = "\x00".join(texts)
+    starts = np.zeros(len(texts), dtype=np.int64)
+    if len(texts) > 1:
+        starts[1:] = np.cumsum([len(text) + 1 for text in texts[:-1]])
+    scores = np.zeros(len(texts), dtype=np.float64)
+
+    for term in query_terms:
+        escaped = re.escape(term)
+        positions = np.fromiter((m.start() for m in re.finditer(escaped, big)), dtype=np.int64)
+        if not positions.size:
+            continue
+        # 精确匹配加分
+        doc_ids = np.searchsorted(starts, positions, side="right") - 1
+        scores += np.bincount(doc_ids, minlength=len(texts))
+
+        # 标题/开头匹配额外加分
+        line_hits = np.fromiter(
+            (m.start() for m in re.finditer(r"(?<![^\n\x00])" + escaped, big)), dtype=np.int64
+        )
+        if line_hits.size:
+            scores[np.unique(np.searchsorted(starts, line_hits, side="right") - 1)] += 0.5
+
     scored_items = []
-    for record in metadata:
-        text = record.get("text", "").lower()
-        
-        # 计算匹配分数
-        score = 0.0
-        for term in query_terms:
-            if term in text:
-                # 精确匹配加分
-                count = text.count(term)
-                score += count * 1.0
-                
-                # 标题/开头匹配额外加分
-                if text.startswith(term) or f"\n{term}" in text:
-                    score += 0.5
-        
-        if score > 0:
-            citations = record.get("citations", [])
-            chunk = Chunk(
-                id=record.get("id", ""),
-                text=record.get("text", ""),
-                citations=[Citation(**c) for c in citations],
-            )
-            scored_items.append((chunk, score))
+    for doc_idx in np.flatnonzero(scores).tolist():
+        record = metadata[doc_idx]
+        citations = record.get("citations", [])
+        chunk = Chunk(
+            id=record.get("id", ""),
+            text=record.get("text", ""),
+            citations=[Citation(**c) for c in citations],
+        )
+        scored_items.append((chunk, float(scores[doc_idx])))
     
-    # 按分数排序
-    scored_items.sort(key=lambda x: x[1], reverse=True)
+    # 只取 top_k，无需全量排序
+    top_items = heapq.nlargest(top_k, scored_items, key=lambda x: x[1])
     
-    hits = [SearchHit(chunk=item[0], score=item[1]) for item in scored_items[:top_k]]
+    hits = [SearchHit(chunk=item[0], score=item[1]) for item in top_items]
     return hits
 
 
@@ -203,9 +490,12 @@ def hybrid_search(
     Returns:
         List[SearchHit]: 搜索结果
     """
-    # 执行两种搜索
-    semantic_hits = search_index(repo_id, query, top_k * 2)
-    keyword_hits = keyword_search(repo_id, query, top_k * 2)
+    # 执行两种搜索（共享同一份已加载的索引与元数据）
+    repo_index = load_repo_index(repo_id)
+    if repo_index is None:
+        return []
+    semantic_hits = repo_index.semantic(query, top_k * 2)
+    keyword_hits = repo_index.keyword(query, top_k * 2)
     
     # 构建分数字典（按 chunk id）
     scores: dict = {}
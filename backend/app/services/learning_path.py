@@ -9,12 +9,20 @@ Learning Path Service - 学习路径推荐服务
 """
 from __future__ import annotations
 
+import heapq
+import re
+from bisect import bisect_right
 from dataclasses import dataclass
-from typing import List, Dict, Any, Optional
-from collections import defaultdict
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+import numpy as np
 
 from app.services.db import (
-    read_symbols_by_repo,
+    SymbolRow,
+    read_symbol_rows_by_repo,
     read_file_edges,
     read_modules,
     read_docs,
@@ -44,33 +52,209 @@ class LearningPath:
     difficulty_levels: Dict[str, List[str]]
 
 
-def _calculate_file_complexity(symbols: List[Dict]) -> int:
-    """计算文件复杂度分数"""
-    score = 0
-    for sym in symbols:
-        kind = sym.get("kind", "")
-        if kind == "class":
-            score += 10
-        elif kind == "function":
-            score += 3
-        elif kind == "method":
-            score += 2
-    return score
+# 符号类型对应的复杂度分值
+KIND_SCORE: Dict[str, int] = {"class": 10, "function": 3, "method": 2}
+
+# 复杂度阈值：< 15 为入门，< 40 为进阶，其余为高级
+_DIFFICULTY_THRESHOLDS = [15, 40]
+_DIFFICULTY_LEVELS = ("beginner", "intermediate", "advanced")
+
+
+# 符号类型的整数编码（0=class, 1=function, 2=method, 3=其他）及对应分值表
+_KIND_CODES: Dict[str, int] = {"class": 0, "function": 1, "method": 2}
+_KIND_OTHER = 3
+_KIND_WEIGHTS = np.array(
+    [KIND_SCORE["class"], KIND_SCORE["function"], KIND_SCORE["method"], 0], dtype=np.int64
+)
+
+# 入口函数名（小写）
+_ENTRY_NAMES = frozenset(("main", "__main__", "cli", "run"))
+
+# 入口文件名关键词，一次正则扫描代替多次子串查找
+_ENTRY_PATH_RE = re.compile(r"main|app|index|cli|run")
+
+
+@dataclass
+class _RepoSymbols:
+    """
+    仓库符号的预计算数组（按文件编号），各推荐函数共享
+
+    file_paths[i] 为编号 i 的文件，file_ids / kinds 与 symbols 一一对应，
+    complexities[i] 为文件 i 的复杂度；name_counts 为公开类/函数名的出现次数，
+    entry_names 为各文件中入口函数名（main/cli/run 等）列表。
+    """
+    symbols: List[SymbolRow]
+    file_paths: List[str]
+    file_index: Dict[str, int]
+    file_ids: np.ndarray
+    kinds: np.ndarray
+    complexities: np.ndarray
+    file_symbols: Dict[str, List[SymbolRow]]
+    name_counts: Counter
+    entry_names: Dict[str, List[str]]
+
+
+def _build_repo_symbols(symbols: List[SymbolRow]) -> _RepoSymbols:
+    """
+    单次遍历符号，同时完成按文件分组、名称计数和入口函数识别。
+
+    file_path 按首次出现顺序编号，kind 编码为 int8，
+    然后用 np.bincount 一次性按文件累加复杂度分值。
+    """
+    file_index: Dict[str, int] = {}
+    file_ids = np.empty(len(symbols), dtype=np.int32)
+    kinds = np.empty(len(symbols), dtype=np.int8)
+    file_symbols: Dict[str, List[SymbolRow]] = {}
+    name_counts: Counter = Counter()
+    entry_names: Dict[str, List[str]] = defaultdict(list)
+    for i, sym in enumerate(symbols):
+        file_id = file_index.get(sym.file_path)
+        if file_id is None:
+            file_id = file_index[sym.file_path] = len(file_index)
+            file_symbols[sym.file_path] = []
+        file_ids[i] = file_id
+        kind_code = _KIND_CODES.get(sym.kind, _KIND_OTHER)
+        kinds[i] = kind_code
+        file_symbols[sym.file_path].append(sym)
+        # 只统计公开的 class / function 名
+        if kind_code <= 1 and sym.name and not sym.name.startswith("_"):
+            name_counts[sym.name] += 1
+        if sym.name_lower in _ENTRY_NAMES:
+            entry_names[sym.file_path].append(sym.name)
+    complexities = np.bincount(
+        file_ids, weights=_KIND_WEIGHTS[kinds], minlength=len(file_index)
+    ).astype(np.int64)
+    return _RepoSymbols(
+        symbols=symbols,
+        file_paths=list(file_index),
+        file_index=file_index,
+        file_ids=file_ids,
+        kinds=kinds,
+        complexities=complexities,
+        file_symbols=file_symbols,
+        name_counts=name_counts,
+        entry_names=entry_names,
+    )
+
+
+@lru_cache(maxsize=8)
+def _repo_symbol_soa(repo_id: str) -> _RepoSymbols:
+    return _build_repo_symbols(read_symbol_rows_by_repo(repo_id))
+
+
+@lru_cache(maxsize=8)
+def _module_files_index(repo_id: str) -> Dict[str, List[str]]:
+    """module_id -> 模块文件列表（同一 module_id 以第一份文档为准）"""
+    index: Dict[str, List[str]] = {}
+    for doc in read_docs(repo_id):
+        index.setdefault(doc.get("module_id"), doc.get("files", []))
+    return index
+
+
+def invalidate_repo(repo_id: str) -> None:
+    """
+    仓库符号或文档写入、删除后调用，使缓存的符号数组和模块索引失效
+
+    lru_cache 不支持按键删除，这里直接清空整个缓存（最多 8 个仓库）。
+    """
+    _repo_symbol_soa.cache_clear()
+    _module_files_index.cache_clear()
 
 
-def _get_dependency_count(file_path: str, edges: List[Dict]) -> tuple[int, int]:
-    """获取文件的依赖数和被依赖数"""
-    incoming = 0
-    outgoing = 0
+def _dependency_pairs(repo: _RepoSymbols, edges: List[Dict]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    把文件依赖边映射为去重后的 (src_id, dst_id) 数组
+
+    路径编号沿用仓库文件编号，不含符号的路径顺延编号。
+    返回 (路径表, src_ids, dst_ids)，按 (src_id, dst_id) 升序排列。
+    """
+    paths = list(repo.file_paths)
+    path_index = dict(repo.file_index)
+    src_ids = np.empty(len(edges), dtype=np.int64)
+    dst_ids = np.empty(len(edges), dtype=np.int64)
+    count = 0
     for edge in edges:
-        if edge.get("dst_path") == file_path:
-            incoming += 1
-        if edge.get("src_path") == file_path:
-            outgoing += 1
-    return incoming, outgoing
+        src = edge.get("src_path", "")
+        dst = edge.get("dst_path", "")
+        if not (src and dst):
+            continue
+        for path in (src, dst):
+            if path not in path_index:
+                path_index[path] = len(paths)
+                paths.append(path)
+        src_ids[count] = path_index[src]
+        dst_ids[count] = path_index[dst]
+        count += 1
+    # 与原先的 set 语义一致：同一对文件只计一次
+    keys = np.unique(src_ids[:count] * len(paths) + dst_ids[:count])
+    return paths, keys // len(paths), keys % len(paths)
+
+
+def _topological_order(
+    file_count: int,
+    src_ids: np.ndarray,
+    dst_ids: np.ndarray,
+    sort_keys: List[Tuple[int, int, int]],
+    limit: int,
+) -> List[int]:
+    """
+    Kahn 拓扑排序：src 依赖 dst，则 dst 先输出
+
+    只考虑编号小于 file_count 的文件；可输出的文件放进以 sort_keys 为序的小顶堆，
+    sort_keys[i] 的最后一项必须是 i。堆为空但仍有文件时说明存在循环依赖，
+    取剩余依赖最少的文件打破环。输出 limit 个文件后提前结束。
+    """
+    mask = (src_ids < file_count) & (dst_ids < file_count) & (src_ids != dst_ids)
+    local_src = src_ids[mask]
+    local_dst = dst_ids[mask]
+    # pending[i]：文件 i 尚未输出的依赖数
+    pending = np.bincount(local_src, minlength=file_count).tolist()
+    # 按 dst 分组的反向邻接表：dependents[bounds[i]:bounds[i + 1]] 为依赖文件 i 的文件
+    by_dst = np.argsort(local_dst, kind="stable")
+    dependents = local_src[by_dst].tolist()
+    bounds = np.searchsorted(local_dst[by_dst], np.arange(file_count + 1)).tolist()
+
+    heap = [sort_keys[i] for i in range(file_count) if pending[i] == 0]
+    heapq.heapify(heap)
+    emitted = [False] * file_count
+    order: List[int] = []
+    limit = min(limit, file_count)
+    while len(order) < limit:
+        if not heap:
+            stuck = min(
+                (i for i in range(file_count) if not emitted[i]),
+                key=lambda i: (pending[i], sort_keys[i]),
+            )
+            pending[stuck] = 0
+            heap.append(sort_keys[stuck])
+        file_id = heapq.heappop(heap)[-1]
+        if emitted[file_id]:
+            continue
+        emitted[file_id] = True
+        order.append(file_id)
+        for dependent in dependents[bounds[file_id]:bounds[file_id + 1]]:
+            pending[dependent] -= 1
+            if pending[dependent] == 0:
+                heapq.heappush(heap, sort_keys[dependent])
+    return order
+
 
+def _repo_symbols(repo_id: str, symbols: Optional[List[SymbolRow]]) -> _RepoSymbols:
+    """未传入 symbols 时使用按仓库缓存的结果"""
+    if symbols is None:
+        return _repo_symbol_soa(repo_id)
+    return _build_repo_symbols(symbols)
 
-def find_entry_points(repo_id: str) -> List[Dict[str, Any]]:
+
+def _difficulty(complexity: int) -> str:
+    return _DIFFICULTY_LEVELS[bisect_right(_DIFFICULTY_THRESHOLDS, complexity)]
+
+
+def find_entry_points(
+    repo_id: str,
+    symbols: Optional[List[SymbolRow]] = None,
+    edges: Optional[List[Dict]] = None,
+) -> List[Dict[str, Any]]:
     """
     找出项目入口点
     
@@ -78,22 +262,33 @@ def find_entry_points(repo_id: str) -> List[Dict[str, Any]]:
     1. 被依赖多，依赖少
     2. 包含 main 函数或 __main__
     3. 文件名包含 main, app, index, cli
+
+    symbols / edges 可由调用方预先读取后传入；未传入 symbols 时使用按仓库缓存的符号数组。
     """
-    symbols = read_symbols_by_repo(repo_id)
-    edges = read_file_edges(repo_id)
-    
-    if not symbols:
+    repo = _repo_symbols(repo_id, symbols)
+    if not repo.symbols:
         return []
+    if edges is None:
+        edges = read_file_edges(repo_id)
+    file_symbols = repo.file_symbols
     
-    # 按文件分组符号
-    file_symbols: Dict[str, List[Dict]] = defaultdict(list)
-    for sym in symbols:
-        file_symbols[sym.get("file_path", "")].append(sym)
+    # 一次遍历统计所有文件的依赖数和被依赖数
+    incoming_counts: Dict[str, int] = defaultdict(int)
+    outgoing_counts: Dict[str, int] = defaultdict(int)
+    for edge in edges:
+        incoming_counts[edge.get("dst_path")] += 1
+        outgoing_counts[edge.get("src_path")] += 1
     
     entry_points = []
     
     for file_path, syms in file_symbols.items():
-        incoming, outgoing = _get_dependency_count(file_path, edges)
+        incoming = incoming_counts.get(file_path, 0)
+        outgoing = outgoing_counts.get(file_path, 0)
+        entry_names = repo.entry_names.get(file_path, ())
+        
+        # 没有入口函数且依赖数不得分时，最多只有文件名的 10 分，达不到阈值，直接跳过
+        if not entry_names and incoming <= 3 and outgoing >= 3:
+            continue
         
         # 计算入口点分数
         score = 0
@@ -110,15 +305,12 @@ def find_entry_points(repo_id: str) -> List[Dict[str, Any]]:
             reasons.append("依赖较少")
         
         # 包含 main 函数
-        for sym in syms:
-            name = sym.get("name", "").lower()
-            if name in ("main", "__main__", "cli", "run"):
-                score += 20
-                reasons.append(f"包含 {sym.get('name')} 函数")
+        for name in entry_names:
+            score += 20
+            reasons.append(f"包含 {name} 函数")
         
         # 文件名特征
-        path_lower = file_path.lower()
-        if any(kw in path_lower for kw in ["main", "app", "index", "cli", "run"]):
+        if _ENTRY_PATH_RE.search(file_path.lower()):
             score += 10
             reasons.append("入口文件名")
         
@@ -127,138 +319,87 @@ def find_entry_points(repo_id: str) -> List[Dict[str, Any]]:
                 "file_path": file_path,
                 "score": score,
                 "reasons": reasons,
-                "symbols": [s.get("name") for s in syms[:5]],
+                "symbols": [s.name for s in syms[:5]],
             })
     
-    # 按分数排序
-    entry_points.sort(key=lambda x: x["score"], reverse=True)
-    return entry_points[:10]
+    # 按分数取前10
+    return heapq.nlargest(10, entry_points, key=itemgetter("score"))
 
 
-def generate_reading_order(repo_id: str) -> List[LearningItem]:
+def generate_reading_order(
+    repo_id: str,
+    symbols: Optional[List[SymbolRow]] = None,
+    edges: Optional[List[Dict]] = None,
+) -> List[LearningItem]:
     """
     生成推荐阅读顺序
     
     策略：
-    1. 先读入口点
-    2. 按依赖关系拓扑排序
-    3. 复杂度从低到高
+    1. 按依赖关系拓扑排序：被依赖的文件先于依赖它的文件
+    2. 可同时阅读的文件中，复杂度低、被依赖多的优先
+    3. 遇到循环依赖时，先读剩余依赖最少的文件
     """
-    symbols = read_symbols_by_repo(repo_id)
-    edges = read_file_edges(repo_id)
-    
-    if not symbols:
+    repo = _repo_symbols(repo_id, symbols)
+    if not repo.symbols:
         return []
+    if edges is None:
+        edges = read_file_edges(repo_id)
+    file_count = len(repo.file_paths)
     
-    # 按文件分组
-    file_symbols: Dict[str, List[Dict]] = defaultdict(list)
-    for sym in symbols:
-        file_symbols[sym.get("file_path", "")].append(sym)
-    
-    # 构建依赖图
-    deps_out: Dict[str, set] = defaultdict(set)
-    deps_in: Dict[str, set] = defaultdict(set)
-    
-    for edge in edges:
-        src = edge.get("src_path", "")
-        dst = edge.get("dst_path", "")
-        if src and dst:
-            deps_out[src].add(dst)
-            deps_in[dst].add(src)
-    
-    # 计算每个文件的属性
-    file_info = []
-    for file_path, syms in file_symbols.items():
-        complexity = _calculate_file_complexity(syms)
-        in_count = len(deps_in.get(file_path, set()))
-        out_count = len(deps_out.get(file_path, set()))
-        
-        # 优先级：被依赖多 + 依赖少 + 复杂度低
-        priority = in_count * 3 - out_count - complexity // 5
-        
-        file_info.append({
-            "file_path": file_path,
-            "symbols": syms,
-            "complexity": complexity,
-            "in_count": in_count,
-            "out_count": out_count,
-            "priority": priority,
-        })
+    # 构建依赖图：去重后的边数组，被依赖数用 bincount 统计
+    paths, src_ids, dst_ids = _dependency_pairs(repo, edges)
+    in_counts = np.bincount(dst_ids, minlength=len(paths))[:file_count].tolist()
+    complexities = repo.complexities.tolist()
+    sort_keys = [
+        (complexities[file_id], -in_counts[file_id], file_id)
+        for file_id in range(file_count)
+    ]
     
-    # 排序
-    file_info.sort(key=lambda x: x["priority"], reverse=True)
+    # 拓扑排序只需产出前30个文件（最多30个）
+    top_ids = _topological_order(file_count, src_ids, dst_ids, sort_keys, limit=30)
     
     # 生成学习项
     items = []
-    for idx, info in enumerate(file_info[:30]):  # 最多30个文件
-        complexity = info["complexity"]
-        if complexity < 15:
-            difficulty = "beginner"
-        elif complexity < 40:
-            difficulty = "intermediate"
-        else:
-            difficulty = "advanced"
-        
+    for idx, file_id in enumerate(top_ids):
+        file_path = repo.file_paths[file_id]
+        syms = repo.file_symbols[file_path]
+        # 只为输出的文件取依赖列表：边按 src_id 排序，二分定位区间
+        lo, hi = np.searchsorted(src_ids, [file_id, file_id + 1])
         items.append(LearningItem(
-            file_path=info["file_path"],
-            title=info["file_path"].split("/")[-1],
-            description=f"包含 {len(info['symbols'])} 个符号",
-            difficulty=difficulty,
+            file_path=file_path,
+            title=file_path.split("/")[-1],
+            description=f"包含 {len(syms)} 个符号",
+            difficulty=_difficulty(int(repo.complexities[file_id])),
             order=idx + 1,
-            key_symbols=[s.get("name", "") for s in info["symbols"][:5]],
-            dependencies=list(deps_out.get(info["file_path"], set()))[:5],
+            key_symbols=[s.name for s in syms[:5]],
+            dependencies=[paths[dst] for dst in dst_ids[lo:min(hi, lo + 5)].tolist()],
         ))
     
     return items
 
 
-def extract_key_concepts(repo_id: str) -> List[str]:
+def extract_key_concepts(repo_id: str, symbols: Optional[List[SymbolRow]] = None) -> List[str]:
     """
     提取关键概念（高频类名和函数名）
     """
-    symbols = read_symbols_by_repo(repo_id)
-    if not symbols:
-        return []
-    
-    # 统计类和函数名
-    name_counts: Dict[str, int] = defaultdict(int)
-    for sym in symbols:
-        kind = sym.get("kind", "")
-        name = sym.get("name", "")
-        if kind in ("class", "function") and name and not name.startswith("_"):
-            name_counts[name] += 1
+    repo = _repo_symbols(repo_id, symbols)
     
-    # 按出现次数排序
-    sorted_names = sorted(name_counts.items(), key=lambda x: x[1], reverse=True)
-    
-    # 返回前20个
-    return [name for name, _ in sorted_names[:20]]
+    # 类和函数名的出现次数已在构建时统计，按次数取前20个
+    return [name for name, _ in repo.name_counts.most_common(20)]
 
 
-def categorize_by_difficulty(repo_id: str) -> Dict[str, List[str]]:
+def categorize_by_difficulty(repo_id: str, symbols: Optional[List[SymbolRow]] = None) -> Dict[str, List[str]]:
     """
     按难度分类文件
     """
-    symbols = read_symbols_by_repo(repo_id)
-    if not symbols:
+    repo = _repo_symbols(repo_id, symbols)
+    if not repo.symbols:
         return {"beginner": [], "intermediate": [], "advanced": []}
     
-    # 按文件分组
-    file_symbols: Dict[str, List[Dict]] = defaultdict(list)
-    for sym in symbols:
-        file_symbols[sym.get("file_path", "")].append(sym)
-    
     result = {"beginner": [], "intermediate": [], "advanced": []}
     
-    for file_path, syms in file_symbols.items():
-        complexity = _calculate_file_complexity(syms)
-        
-        if complexity < 15:
-            result["beginner"].append(file_path)
-        elif complexity < 40:
-            result["intermediate"].append(file_path)
-        else:
-            result["advanced"].append(file_path)
+    for file_path, complexity in zip(repo.file_paths, repo.complexities.tolist()):
+        result[_difficulty(complexity)].append(file_path)
     
     # 每个级别最多10个
     for key in result:
@@ -271,9 +412,11 @@ def get_learning_path(repo_id: str) -> LearningPath:
     """
     获取完整学习路径
     """
+    # 符号数组按仓库缓存，依赖边只读取一次并在各子步骤间共享
+    edges = read_file_edges(repo_id)
     return LearningPath(
-        recommended_order=generate_reading_order(repo_id),
-        entry_points=find_entry_points(repo_id),
+        recommended_order=generate_reading_order(repo_id, edges=edges),
+        entry_points=find_entry_points(repo_id, edges=edges),
         key_concepts=extract_key_concepts(repo_id),
         difficulty_levels=categorize_by_difficulty(repo_id),
     )
@@ -283,44 +426,42 @@ def get_module_learning_path(repo_id: str, module_id: str) -> Dict[str, Any]:
     """
     获取模块内的学习路径
     """
-    docs = read_docs(repo_id)
-    symbols = read_symbols_by_repo(repo_id)
-    
     # 找到模块的文件
-    module_files = []
-    for doc in docs:
-        if doc.get("module_id") == module_id:
-            module_files = doc.get("files", [])
-            break
+    module_files = _module_files_index(repo_id).get(module_id)
     
     if not module_files:
         return {"files": [], "key_symbols": []}
     
-    # 过滤模块内的符号
-    module_symbols = [s for s in symbols if s.get("file_path") in module_files]
-    
-    # 按文件分组
-    file_symbols: Dict[str, List[Dict]] = defaultdict(list)
-    for sym in module_symbols:
-        file_symbols[sym.get("file_path", "")].append(sym)
+    repo = _repo_symbol_soa(repo_id)
     
-    # 排序文件
-    sorted_files = sorted(
-        file_symbols.items(),
-        key=lambda x: _calculate_file_complexity(x[1])
+    # 模块文件映射为文件编号（按编号升序，即文件首次出现顺序）
+    module_ids = np.fromiter(
+        (repo.file_index[path] for path in set(module_files) if path in repo.file_index),
+        dtype=np.int32,
     )
+    module_ids.sort()
+    
+    # 按复杂度稳定排序文件（复杂度已按文件编号缓存）
+    sorted_ids = module_ids[np.argsort(repo.complexities[module_ids], kind="stable")].tolist()
+    
+    # 向量化筛出模块内的 class / function 符号，再按顺序取前10个公开名称
+    mask = np.isin(repo.file_ids, module_ids) & (repo.kinds <= 1)
+    key_symbols: List[str] = []
+    for idx in np.flatnonzero(mask).tolist():
+        name = repo.symbols[idx].name
+        if not name.startswith("_"):
+            key_symbols.append(name)
+            if len(key_symbols) == 10:
+                break
     
     return {
         "files": [
             {
-                "path": path,
-                "symbols": [s.get("name") for s in syms[:5]],
-                "complexity": _calculate_file_complexity(syms),
+                "path": repo.file_paths[file_id],
+                "symbols": [s.name for s in repo.file_symbols[repo.file_paths[file_id]][:5]],
+                "complexity": int(repo.complexities[file_id]),
             }
-            for path, syms in sorted_files
+            for file_id in sorted_ids
         ],
-        "key_symbols": [
-            s.get("name") for s in module_symbols
-            if s.get("kind") in ("class", "function") and not s.get("name", "").startswith("_")
-        ][:10],
+        "key_symbols": key_symbols,
     }
@@ -1,23 +1,47 @@
 ﻿from __future__ import annotations
 
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import List, Generator, Tuple, Dict
-import json
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from app.models.schemas import ModelConfig
 
 
+def _build_session() -> requests.Session:
+    """Shared session so repeated completions reuse keep-alive connections."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=8,
+        pool_maxsize=32,
+        max_retries=Retry(total=3, backoff_factor=0.1),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_SESSION = _build_session()
+
+
 @dataclass(frozen=True)
 class LLMMessage:
     role: str
     content: str
 
+    @property
+    def as_dict(self) -> Dict[str, str]:
+        # A fresh dict per payload: callers may mutate the request without touching the message.
+        return {"role": self.role, "content": self.content}
+
 
 def _to_payload(messages: List[LLMMessage], model: ModelConfig, stream: bool = False, enable_thinking: bool = True) -> dict:
     payload = {
         "model": model.model_name,
-        "messages": [{"role": m.role, "content": m.content} for m in messages],
+        "messages": [m.as_dict for m in messages],
         "max_tokens": model.max_tokens,
         "stream": stream,
     }
@@ -29,6 +53,7 @@ def _to_payload(messages: List[LLMMessage], model: ModelConfig, stream: bool = F
     return payload
 
 
+@lru_cache(maxsize=32)
 def _build_chat_url(base_url: str) -> str:
     """Build chat completions URL, avoiding duplicate version paths."""
     base = base_url.rstrip("/")
@@ -52,8 +77,8 @@ def chat_completion_with_usage(messages: List[LLMMessage], model: ModelConfig) -
         "Authorization": f"Bearer {model.api_key}",
         "Content-Type": "application/json",
     }
-    payload = _to_payload(messages, model)
-    response = requests.post(url, headers=headers, json=payload, timeout=model.timeout_s)
+    body = orjson.dumps(_to_payload(messages, model))
+    response = _SESSION.post(url, headers=headers, data=body, timeout=model.timeout_s)
     response.raise_for_status()
     data = response.json()
     choices = data.get("choices", [])
@@ -94,20 +119,20 @@ def chat_completion_stream(messages: List[LLMMessage], model: ModelConfig, enabl
         "Authorization": f"Bearer {model.api_key}",
         "Content-Type": "application/json",
     }
-    payload = _to_payload(messages, model, stream=True, enable_thinking=enable_thinking)
+    body = orjson.dumps(_to_payload(messages, model, stream=True, enable_thinking=enable_thinking))
     
-    with requests.post(url, headers=headers, json=payload, timeout=model.timeout_s, stream=True) as response:
+    with _SESSION.post(url, headers=headers, data=body, timeout=model.timeout_s, stream=True) as response:
         response.raise_for_status()
-        for line in response.iter_lines():
+        # Work on raw bytes: orjson parses bytes directly, so lines are never decoded.
+        for line in response.iter_lines(decode_unicode=False):
             if not line:
                 continue
-            line_str = line.decode("utf-8")
-            if line_str.startswith("data: "):
-                data_str = line_str[6:]
-                if data_str.strip() == "[DONE]":
+            if line.startswith(b"data: "):
+                data_bytes = line[6:]
+                if data_bytes.strip() == b"[DONE]":
                     break
                 try:
-                    data = json.loads(data_str)
+                    data = orjson.loads(data_bytes)
                     usage = data.get("usage")
                     if usage:
                         yield {"type": "usage", "usage": usage}
@@ -123,5 +148,5 @@ def chat_completion_stream(messages: List[LLMMessage], model: ModelConfig, enabl
                         content = delta.get("content", "")
                         if content:
                             yield {"type": "content", "text": content}
-                except json.JSONDecodeError:
+                except orjson.JSONDecodeError:
                     continue
@@ -8,12 +8,23 @@ MCP Generator Service - 自动生成 MCP Server 供 AI 调用
 """
 from __future__ import annotations
 
-import json
+import hashlib
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from types import MappingProxyType
+from typing import Dict, Any, List, Optional, Set, Tuple
 from dataclasses import dataclass, asdict
 
+import orjson
+
+try:  # 可选依赖：MCP_MINIFY=1 时压缩生成的 Server 代码
+    import python_minifier
+except ImportError:
+    python_minifier = None
+
 from app.services.db import (
     get_repo_root,
     read_summary,
@@ -249,42 +260,67 @@ MCP_TOOLS = [
     ),
 ]
 
-
-def generate_mcp_server_code(repo_id: str, port: int = 9100) -> str:
-    """
-    生成独立的 MCP Server Python 代码（SSE 远程连接模式）
-    
-    Args:
-        repo_id: 仓库ID
-        port: SSE 服务端口
-    
-    Returns:
-        MCP Server 的 Python 代码
-    """
-    repo_root = get_repo_root(repo_id)
-    summary = read_summary(repo_id)
-    
-    repo_name = Path(repo_root).name if repo_root else repo_id
-    languages = summary.get("languages", []) if summary else []
-    
-    code = f'''#!/usr/bin/env python3
+# 按名称索引的工具表；input_schema 包装为只读视图，防止共享的预计算结果被修改
+MCP_TOOLS_BY_NAME: Dict[str, MCPTool] = {
+    tool.name: MCPTool(tool.name, tool.description, MappingProxyType(tool.input_schema))
+    for tool in MCP_TOOLS
+}
+
+# 工具列表在导入时序列化一次，接口直接返回
+_MCP_TOOLS_LIST: List[Dict[str, Any]] = [
+    {
+        "name": tool.name,
+        "description": tool.description,
+        "input_schema": tool.input_schema,
+    }
+    for tool in MCP_TOOLS_BY_NAME.values()
+]
+_MCP_TOOLS_JSON: bytes = orjson.dumps({"tools": _MCP_TOOLS_LIST}, default=dict)
+
+
+# 生成的 MCP Server 实际转发的工具（输出顺序沿用 MCP_TOOLS）
+_SERVER_TOOL_NAMES = frozenset((
+    "search_code",
+    "get_file_content",
+    "get_file_chunk",
+    "get_file_tree",
+    "search_in_file",
+    "search_symbols",
+    "get_project_summary",
+    "get_modules",
+    "get_file_outline",
+    "get_entry_points",
+    "get_learning_path",
+))
+# 以 Python 字符串字面量形式嵌入生成代码的工具 JSON
+_SERVER_TOOLS_JSON = repr(orjson.dumps(
+    [tool for tool in _MCP_TOOLS_LIST if tool["name"] in _SERVER_TOOL_NAMES],
+    default=dict,
+).decode("utf-8"))
+
+
+# 生成代码与说明文档的模板，导入时编码为 UTF-8 字节，生成时直接在字节上替换占位符
+_SERVER_TEMPLATE = '''#!/usr/bin/env python3
 """
-MCP Server for {repo_name} (SSE Mode)
+MCP Server for ${repo_name} (SSE Mode)
 Auto-generated by Codebase Analyzer
 
-Languages: {', '.join(languages)}
-Repo ID: {repo_id}
-Port: {port}
+Languages: ${languages}
+Repo ID: ${repo_id}
+Port: ${port}
 
 Usage:
 1. Install dependencies: pip install mcp httpx starlette uvicorn
-2. Run: python mcp_server_{repo_id}.py
-3. Connect via SSE at http://localhost:{port}/sse
+   (optional speedups: pip install orjson httptools "uvloop; sys_platform != 'win32'")
+2. Run: python mcp_server_${repo_id}.py
+3. Connect via SSE at http://localhost:${port}/sse
 """
 import asyncio
 import json
 import httpx
 import os
+import time
+from collections import OrderedDict
 from contextlib import asynccontextmanager
 
 from mcp.server import Server
@@ -294,214 +330,192 @@ from starlette.applications import Starlette
 from starlette.routing import Route, Mount
 from starlette.responses import JSONResponse
 
+try:
+    import orjson
+
+    def dumps(obj) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode("utf-8")
+except ImportError:
+    def dumps(obj) -> str:
+        return json.dumps(obj, indent=2, ensure_ascii=False)
+
 # Configuration
 API_BASE = os.getenv("API_BASE", "http://localhost:8000")
-REPO_ID = "{repo_id}"
-PORT = int(os.getenv("MCP_PORT", "{port}"))
+REPO_ID = "${repo_id}"
+PORT = int(os.getenv("MCP_PORT", "${port}"))
 
-server = Server("{repo_name}-codebase")
+server = Server("${repo_name}-codebase")
 sse = SseServerTransport("/messages/")
 
+# Tool definitions, generated from the Codebase Analyzer tool registry
+TOOLS_SCHEMA = json.loads(${tools_json})
+
+
+# Shared HTTP client: keeps connections to the API alive across tool calls
+_client: "httpx.AsyncClient | None" = None
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+        )
+    return _client
+
 
-async def call_api(endpoint: str, method: str = "GET", data: dict = None) -> dict:
-    """Call the Codebase Analyzer API"""
-    async with httpx.AsyncClient() as client:
-        url = f"{{API_BASE}}{{endpoint}}"
-        try:
-            if method == "GET":
-                response = await client.get(url, timeout=30.0)
-            else:
-                response = await client.post(url, json=data, timeout=30.0)
-            
-            if response.status_code >= 400:
-                return {{"error": f"HTTP {{response.status_code}}: {{response.text[:200]}}"}}
-            
-            content = response.text
-            if not content or not content.strip():
-                return {{"error": "Empty response from API"}}
-            
-            return response.json()
-        except httpx.RequestError as e:
-            return {{"error": f"Request failed: {{str(e)}}"}}
-        except Exception as e:
-            return {{"error": f"API call failed: {{str(e)}}"}}
+@asynccontextmanager
+async def lifespan(app):
+    """Open the shared client on startup and close it on shutdown"""
+    get_client()
+    try:
+        yield
+    finally:
+        global _client
+        if _client is not None:
+            await _client.aclose()
+            _client = None
+
+
+async def call_api(endpoint: str, method: str = "GET", params: dict = None, data: dict = None) -> dict:
+    """Call the Codebase Analyzer API; query parameters are URL-encoded by httpx"""
+    client = get_client()
+    url = f"{API_BASE}{endpoint}"
+    try:
+        if method == "GET":
+            response = await client.get(url, params=params)
+        else:
+            response = await client.post(url, params=params, json=data)
+        
+        if response.status_code >= 400:
+            return {"error": f"HTTP {response.status_code}: {response.text[:200]}"}
+        
+        content = response.text
+        if not content or not content.strip():
+            return {"error": "Empty response from API"}
+        
+        return response.json()
+    except httpx.RequestError as e:
+        return {"error": f"Request failed: {str(e)}"}
+    except Exception as e:
+        return {"error": f"API call failed: {str(e)}"}
 
 
 @server.list_tools()
 async def list_tools() -> list[Tool]:
     """List available tools"""
     return [
-        Tool(
-            name="search_code",
-            description="语义搜索代码库，找到与查询相关的代码片段",
-            inputSchema={{
-                "type": "object",
-                "properties": {{
-                    "query": {{"type": "string", "description": "搜索查询"}},
-                    "top_k": {{"type": "integer", "description": "返回数量", "default": 5}}
-                }},
-                "required": ["query"]
-            }}
-        ),
-        Tool(
-            name="get_file_content",
-            description="获取指定文件的完整内容",
-            inputSchema={{
-                "type": "object",
-                "properties": {{
-                    "file_path": {{"type": "string", "description": "文件路径"}}
-                }},
-                "required": ["file_path"]
-            }}
-        ),
-        Tool(
-            name="get_file_chunk",
-            description="按行获取文件内容分块",
-            inputSchema={{
-                "type": "object",
-                "properties": {{
-                    "file_path": {{"type": "string", "description": "文件路径"}},
-                    "offset": {{"type": "integer", "description": "起始行", "default": 1}},
-                    "limit": {{"type": "integer", "description": "行数", "default": 200}}
-                }},
-                "required": ["file_path"]
-            }}
-        ),
-        Tool(
-            name="get_file_tree",
-            description="获取项目文件目录结构",
-            inputSchema={{"type": "object", "properties": {{}}, "required": []}}
-        ),
-        Tool(
-            name="search_in_file",
-            description="在单文件内搜索文本",
-            inputSchema={{
-                "type": "object",
-                "properties": {{
-                    "file_path": {{"type": "string", "description": "文件路径"}},
-                    "query": {{"type": "string", "description": "搜索查询"}},
-                    "context": {{"type": "integer", "description": "上下文行数", "default": 2}},
-                    "limit": {{"type": "integer", "description": "最大返回数量", "default": 20}},
-                    "case_sensitive": {{"type": "boolean", "description": "区分大小写", "default": False}},
-                    "use_regex": {{"type": "boolean", "description": "使用正则", "default": False}}
-                }},
-                "required": ["file_path", "query"]
-            }}
-        ),
-        Tool(
-            name="search_symbols",
-            description="搜索代码符号（类、函数、方法）",
-            inputSchema={{
-                "type": "object",
-                "properties": {{
-                    "query": {{"type": "string", "description": "符号名称"}},
-                    "kind": {{"type": "string", "description": "类型过滤", "enum": ["class", "function", "method"]}}
-                }},
-                "required": ["query"]
-            }}
-        ),
-        Tool(
-            name="get_project_summary",
-            description="获取项目概览信息",
-            inputSchema={{"type": "object", "properties": {{}}, "required": []}}
-        ),
-        Tool(
-            name="get_modules",
-            description="获取项目模块列表",
-            inputSchema={{"type": "object", "properties": {{}}, "required": []}}
-        ),
-        Tool(
-            name="get_file_outline",
-            description="获取文件符号大纲",
-            inputSchema={{
-                "type": "object",
-                "properties": {{
-                    "file_path": {{"type": "string", "description": "文件路径"}}
-                }},
-                "required": ["file_path"]
-            }}
-        ),
-        Tool(
-            name="get_entry_points",
-            description="获取项目入口点",
-            inputSchema={{"type": "object", "properties": {{}}, "required": []}}
-        ),
-        Tool(
-            name="get_learning_path",
-            description="获取推荐学习路径",
-            inputSchema={{"type": "object", "properties": {{}}, "required": []}}
-        ),
+        Tool(name=t["name"], description=t["description"], inputSchema=t["input_schema"])
+        for t in TOOLS_SCHEMA
     ]
 
 
+# Tool name -> (HTTP method, path template, [(argument, API parameter, default)]).
+# GET parameters go into the query string, POST parameters into the JSON body.
+REQUIRED = object()
+ROUTES = {
+    "search_code": ("POST", "/repos/{repo_id}/search", [
+        ("query", "query", REQUIRED),
+        ("top_k", "top_k", 5),
+    ]),
+    "get_file_content": ("GET", "/repos/{repo_id}/files/{file_path}", []),
+    "get_file_chunk": ("GET", "/repos/{repo_id}/files/chunk", [
+        ("file_path", "file_path", REQUIRED),
+        ("offset", "offset", 1),
+        ("limit", "limit", 200),
+    ]),
+    "get_file_tree": ("GET", "/repos/{repo_id}/files", []),
+    "search_in_file": ("GET", "/repos/{repo_id}/files/search-in-file", [
+        ("file_path", "file_path", REQUIRED),
+        ("query", "q", REQUIRED),
+        ("context", "context", 2),
+        ("limit", "limit", 20),
+        ("case_sensitive", "case_sensitive", False),
+        ("use_regex", "use_regex", False),
+    ]),
+    "search_symbols": ("GET", "/repos/{repo_id}/symbols", [
+        ("query", "q", REQUIRED),
+        ("kind", "kind", ""),
+    ]),
+    "get_project_summary": ("GET", "/repos/{repo_id}/summary", []),
+    "get_modules": ("GET", "/repos/{repo_id}/modules", []),
+    "get_file_outline": ("GET", "/repos/{repo_id}/outline/{file_path}", []),
+    "get_entry_points": ("GET", "/repos/{repo_id}/entry-points", []),
+    "get_learning_path": ("GET", "/repos/{repo_id}/learning-path", []),
+}
+
+
+def build_request(name: str, arguments: dict) -> tuple[str, str, dict]:
+    """Resolve a tool call into (method, endpoint, parameters); empty optional values are dropped"""
+    method, path, fields = ROUTES[name]
+    endpoint = path.format_map({**arguments, "repo_id": REPO_ID})
+    params = {}
+    for arg, param, default in fields:
+        value = arguments[arg] if default is REQUIRED else arguments.get(arg, default)
+        if value is not None and value != "":
+            params[param] = value
+    return method, endpoint, params
+
+
+# Short-lived LRU cache for read-only tools whose results rarely change within a session
+CACHE_TTL = float(os.getenv("MCP_CACHE_TTL", "60"))
+CACHE_MAXSIZE = 512
+CACHEABLE_TOOLS = frozenset({
+    "get_file_content",
+    "get_file_tree",
+    "get_file_outline",
+    "get_modules",
+    "get_project_summary",
+    "get_entry_points",
+    "get_learning_path",
+})
+_resp_cache: "OrderedDict[str, tuple[float, object]]" = OrderedDict()
+
+
+def cache_get(key: str):
+    entry = _resp_cache.get(key)
+    if entry is None:
+        return None
+    expires_at, result = entry
+    if expires_at < time.monotonic():
+        del _resp_cache[key]
+        return None
+    _resp_cache.move_to_end(key)
+    return result
+
+
+def cache_put(key: str, result) -> None:
+    _resp_cache[key] = (time.monotonic() + CACHE_TTL, result)
+    _resp_cache.move_to_end(key)
+    while len(_resp_cache) > CACHE_MAXSIZE:
+        _resp_cache.popitem(last=False)
+
+
 @server.call_tool()
 async def call_tool(name: str, arguments: dict) -> list[TextContent]:
     """Handle tool calls"""
     try:
-        if name == "search_code":
-            result = await call_api(
-                f"/repos/{{REPO_ID}}/search",
-                method="POST",
-                data={{"query": arguments["query"], "top_k": arguments.get("top_k", 5)}}
-            )
-            
-        elif name == "get_file_content":
-            file_path = arguments["file_path"]
-            result = await call_api(f"/repos/{{REPO_ID}}/files/{{file_path}}")
-            
-        elif name == "get_file_chunk":
-            file_path = arguments["file_path"]
-            offset = arguments.get("offset", 1)
-            limit = arguments.get("limit", 200)
-            result = await call_api(
-                f"/repos/{{REPO_ID}}/files/chunk?file_path={{file_path}}&offset={{offset}}&limit={{limit}}"
-            )
-            
-        elif name == "get_file_tree":
-            result = await call_api(f"/repos/{{REPO_ID}}/files")
-            
-        elif name == "search_in_file":
-            file_path = arguments["file_path"]
-            query = arguments["query"]
-            context = arguments.get("context", 2)
-            limit = arguments.get("limit", 20)
-            case_sensitive = arguments.get("case_sensitive", False)
-            use_regex = arguments.get("use_regex", False)
-            result = await call_api(
-                f"/repos/{{REPO_ID}}/files/search-in-file?file_path={{file_path}}&q={{query}}&context={{context}}&limit={{limit}}&case_sensitive={{case_sensitive}}&use_regex={{use_regex}}"
-            )
-            
-        elif name == "search_symbols":
-            query = arguments["query"]
-            kind = arguments.get("kind", "")
-            url = f"/repos/{{REPO_ID}}/symbols?q={{query}}"
-            if kind:
-                url += f"&kind={{kind}}"
-            result = await call_api(url)
-            
-        elif name == "get_project_summary":
-            result = await call_api(f"/repos/{{REPO_ID}}/summary")
-            
-        elif name == "get_modules":
-            result = await call_api(f"/repos/{{REPO_ID}}/modules")
-            
-        elif name == "get_file_outline":
-            file_path = arguments["file_path"]
-            result = await call_api(f"/repos/{{REPO_ID}}/outline/{{file_path}}")
-            
-        elif name == "get_entry_points":
-            result = await call_api(f"/repos/{{REPO_ID}}/entry-points")
-            
-        elif name == "get_learning_path":
-            result = await call_api(f"/repos/{{REPO_ID}}/learning-path")
-            
+        if name not in ROUTES:
+            result = {"error": f"Unknown tool: {name}"}
         else:
-            result = {{"error": f"Unknown tool: {{name}}"}}
+            cache_key = None
+            if name in CACHEABLE_TOOLS and CACHE_TTL > 0:
+                cache_key = name + ":" + json.dumps(arguments, sort_keys=True, default=str)
+            result = cache_get(cache_key) if cache_key else None
+            if result is None:
+                method, endpoint, params = build_request(name, arguments)
+                if method == "POST":
+                    result = await call_api(endpoint, method="POST", data=params)
+                else:
+                    result = await call_api(endpoint, params=params)
+                if cache_key and not (isinstance(result, dict) and "error" in result):
+                    cache_put(cache_key, result)
         
-        return [TextContent(type="text", text=json.dumps(result, indent=2, ensure_ascii=False))]
+        return [TextContent(type="text", text=dumps(result))]
         
     except Exception as e:
-        return [TextContent(type="text", text=f"Error: {{str(e)}}")]
+        return [TextContent(type="text", text=f"Error: {str(e)}")]
 
 
 async def handle_sse(request):
@@ -519,7 +533,13 @@ async def handle_messages(request):
 
 async def health_check(request):
     """Health check endpoint"""
-    return JSONResponse({{"status": "ok", "repo_id": REPO_ID}})
+    return JSONResponse({"status": "ok", "repo_id": REPO_ID})
+
+
+async def invalidate_cache(request):
+    """Drop cached tool responses, e.g. after the repository is re-analyzed"""
+    _resp_cache.clear()
+    return JSONResponse({"status": "ok"})
 
 
 app = Starlette(
@@ -527,116 +547,25 @@ app = Starlette(
         Route("/sse", endpoint=handle_sse),
         Route("/messages/", endpoint=handle_messages, methods=["POST"]),
         Route("/health", endpoint=health_check),
-    ]
+        Route("/invalidate", endpoint=invalidate_cache, methods=["POST"]),
+    ],
+    lifespan=lifespan,
 )
 
 
 if __name__ == "__main__":
     import uvicorn
-    print(f"Starting MCP Server for {{REPO_ID}} on port {{PORT}}")
-    print(f"SSE endpoint: http://localhost:{{PORT}}/sse")
-    uvicorn.run(app, host="0.0.0.0", port=PORT)
-'''
-    return code
-
-
-def generate_cursor_mcp_config(repo_id: str, port: int = 9100, host: str = "localhost") -> Dict[str, Any]:
-    """
-    生成 Cursor MCP 配置（SSE 远程连接模式）
-    
-    Args:
-        repo_id: 仓库ID
-        port: MCP Server SSE 端口
-        host: MCP Server 主机地址
-    
-    Returns:
-        Cursor MCP 配置 JSON
-    """
-    repo_root = get_repo_root(repo_id)
-    repo_name = Path(repo_root).name if repo_root else repo_id
-    
-    return {
-        "mcpServers": {
-            f"{repo_name}-codebase": {
-                "url": f"http://{host}:{port}/sse"
-            }
-        }
-    }
-
-
-def generate_claude_desktop_config(repo_id: str, port: int = 9100, host: str = "localhost") -> Dict[str, Any]:
-    """
-    生成 Claude Desktop MCP 配置（SSE 远程连接模式）
-    """
-    repo_root = get_repo_root(repo_id)
-    repo_name = Path(repo_root).name if repo_root else repo_id
-    
-    return {
-        "mcpServers": {
-            f"{repo_name}-codebase": {
-                "url": f"http://{host}:{port}/sse"
-            }
-        }
-    }
-
-
-def save_mcp_server(repo_id: str, output_dir: Optional[str] = None, port: int = 9100, host: str = "localhost") -> Dict[str, Any]:
-    """
-    保存 MCP Server 文件到指定目录
-    
-    Args:
-        repo_id: 仓库ID
-        output_dir: 输出目录，默认为 workspace/mcp
-        port: SSE 服务端口
-        host: 主机地址（用于生成配置）
-    
-    Returns:
-        生成的文件路径信息和端口
-    """
-    if output_dir is None:
-        output_dir = str(Path(__file__).resolve().parents[2] / "workspace" / "mcp")
-    
-    output_path = Path(output_dir)
-    output_path.mkdir(parents=True, exist_ok=True)
-    
-    # 生成 MCP Server 代码
-    server_code = generate_mcp_server_code(repo_id, port)
-    server_file = output_path / f"mcp_server_{repo_id}.py"
-    server_file.write_text(server_code, encoding="utf-8")
-    
-    # 生成 Cursor 配置
-    cursor_config = generate_cursor_mcp_config(repo_id, port, host)
-    cursor_file = output_path / f"cursor_config_{repo_id}.json"
-    cursor_file.write_text(json.dumps(cursor_config, indent=2, ensure_ascii=False), encoding="utf-8")
-    
-    # 生成 Claude Desktop 配置
-    claude_config = generate_claude_desktop_config(repo_id, port, host)
-    claude_file = output_path / f"claude_config_{repo_id}.json"
-    claude_file.write_text(json.dumps(claude_config, indent=2, ensure_ascii=False), encoding="utf-8")
-    
-    # 生成 README
-    readme = generate_mcp_readme(repo_id, port, host)
-    readme_file = output_path / f"README_{repo_id}.md"
-    readme_file.write_text(readme, encoding="utf-8")
-    
-    return {
-        "server_file": str(server_file),
-        "cursor_config": str(cursor_file),
-        "claude_config": str(claude_file),
-        "readme": str(readme_file),
-        "port": port,
-        "sse_url": f"http://{host}:{port}/sse",
-    }
+    print(f"Starting MCP Server for {REPO_ID} on port {PORT}")
+    print(f"SSE endpoint: http://localhost:{PORT}/sse")
+    # "auto" picks uvloop / httptools when installed and falls back to asyncio / h11
+    # otherwise (e.g. uvloop on Windows), so the optional speedups never break startup
+    uvicorn.run(app, host="0.0.0.0", port=PORT, loop="auto", http="auto", log_level="warning")
+'''.encode("utf-8")
 
 
-def generate_mcp_readme(repo_id: str, port: int = 9100, host: str = "localhost") -> str:
-    """生成 MCP 使用说明（SSE 远程连接模式）"""
-    repo_root = get_repo_root(repo_id)
-    repo_name = Path(repo_root).name if repo_root else repo_id
-    
-    return f'''# {repo_name} Codebase MCP Server (SSE 模式)
+_README_TEMPLATE = '''# ${repo_name} Codebase MCP Server (SSE 模式)
 
-这是一个自动生成的 MCP Server，支持 **SSE 远程连接**，让 AI 可以直接查询和理解 `{repo_name}` 代码库。
+这是一个自动生成的 MCP Server，支持 **SSE 远程连接**，让 AI 可以直接查询和理解 `${repo_name}` 代码库。
 
 ## 功能
 
@@ -648,13 +577,15 @@ def generate_mcp_readme(repo_id: str, port: int = 9100, host: str = "localhost")
 
 ## 连接信息
 
-- **SSE 端点**: `http://{host}:{port}/sse`
-- **健康检查**: `http://{host}:{port}/health`
+- **SSE 端点**: `http://${host}:${port}/sse`
+- **健康检查**: `http://${host}:${port}/health`
 
 ## 安装依赖（手动运行时需要）
 
 ```bash
 pip install mcp httpx starlette uvicorn
+# 可选：安装后自动启用更快的 JSON 序列化、事件循环和 HTTP 解析
+pip install orjson httptools "uvloop; sys_platform != 'win32'"
 ```
 
 ## 使用方法
@@ -668,10 +599,10 @@ pip install mcp httpx starlette uvicorn
 ```bash
 # 设置后端地址（可选，默认 http://localhost:8000）
 export API_BASE="http://localhost:8000"
-export MCP_PORT="{port}"
+export MCP_PORT="${port}"
 
 # 启动服务
-python mcp_server_{repo_id}.py
+python mcp_server_${repo_id}.py
 ```
 
 ## 客户端配置
@@ -684,13 +615,13 @@ python mcp_server_{repo_id}.py
 **macOS**: `~/Library/Application Support/Cursor/User/globalStorage/cursor.mcp/config.json`
 
 ```json
-{{
-  "mcpServers": {{
-    "{repo_name}-codebase": {{
-      "url": "http://{host}:{port}/sse"
-    }}
-  }}
-}}
+{
+  "mcpServers": {
+    "${repo_name}-codebase": {
+      "url": "http://${host}:${port}/sse"
+    }
+  }
+}
 ```
 
 ### Claude Desktop
@@ -701,13 +632,13 @@ python mcp_server_{repo_id}.py
 **macOS**: `~/Library/Application Support/Claude/claude_desktop_config.json`
 
 ```json
-{{
-  "mcpServers": {{
-    "{repo_name}-codebase": {{
-      "url": "http://{host}:{port}/sse"
-    }}
-  }}
-}}
+{
+  "mcpServers": {
+    "${repo_name}-codebase": {
+      "url": "http://${host}:${port}/sse"
+    }
+  }
+}
 ```
 
 ### 自定义 MCP Client
@@ -715,10 +646,10 @@ python mcp_server_{repo_id}.py
 任何支持 SSE 传输的 MCP 客户端都可以连接：
 
 ```json
-{{
-  "url": "http://{host}:{port}/sse",
+{
+  "url": "http://${host}:${port}/sse",
   "transport": "sse"
-}}
+}
 ```
 
 ## 可用工具
@@ -757,17 +688,271 @@ python mcp_server_{repo_id}.py
 - 确保 Codebase Analyzer 后端服务运行在 `http://localhost:8000`
 - MCP Server 启动后，配置 Cursor/Claude Desktop 即可使用
 - 配置后重启 IDE 生效
-- 如遇问题检查 `http://{host}:{port}/health`
-'''
+- 如遇问题检查 `http://${host}:${port}/health`
+'''.encode("utf-8")
 
 
-def get_mcp_tools_list() -> List[Dict[str, Any]]:
-    """获取 MCP 工具列表（用于 API 展示）"""
-    return [
-        {
-            "name": tool.name,
-            "description": tool.description,
-            "input_schema": tool.input_schema,
+_PLACEHOLDER_RE = re.compile(rb"\$\{(\w+)\}")
+
+
+def _format_bytes(template: bytes, **subs: Any) -> bytes:
+    """一次扫描替换 ${name} 占位符（替换值中的 ${...} 不会被再次展开）"""
+    encoded = {key.encode("ascii"): str(value).encode("utf-8") for key, value in subs.items()}
+    return _PLACEHOLDER_RE.sub(lambda match: encoded[match.group(1)], template)
+
+
+@lru_cache(maxsize=128)
+def _repo_meta(repo_id: str) -> Tuple[str, Tuple[str, ...]]:
+    """读取仓库名和语言列表（各生成函数共用，结果缓存）"""
+    repo_root = get_repo_root(repo_id)
+    summary = read_summary(repo_id)
+    repo_name = Path(repo_root).name if repo_root else repo_id
+    languages = summary.get("languages", []) if summary else []
+    return repo_name, tuple(languages)
+
+
+def invalidate_mcp_cache(repo_id: str) -> None:
+    """
+    仓库重新分析或删除后调用，清除缓存的仓库元数据
+
+    lru_cache 不支持按键删除，这里直接清空全部缓存。下面的 _server_code 等
+    纯函数只以基本类型为键，不读数据库，无需清除。
+    """
+    _repo_meta.cache_clear()
+
+
+@lru_cache(maxsize=128)
+def _server_code(repo_name: str, languages: Tuple[str, ...], repo_id: str, port: int) -> bytes:
+    """渲染 MCP Server 代码，返回 UTF-8 字节（纯函数，不访问数据库）"""
+    code = _format_bytes(
+        _SERVER_TEMPLATE,
+        repo_name=repo_name,
+        repo_id=repo_id,
+        port=port,
+        languages=", ".join(languages),
+        tools_json=_SERVER_TOOLS_JSON,
+    )
+    # 冒烟检查：模板或替换值有语法问题时在写盘前抛出 SyntaxError，不留下半成品文件
+    compile(code, f"mcp_server_{repo_id}.py", "exec")
+    return code
+
+
+@lru_cache(maxsize=32)
+def _minify_server_code(code: bytes) -> bytes:
+    """去掉注释、文档字符串和多余空白（仅在 MCP_MINIFY=1 且安装了 python-minifier 时使用）"""
+    return python_minifier.minify(code.decode("utf-8"), remove_literal_statements=True).encode("utf-8")
+
+
+def _minify_enabled() -> bool:
+    return python_minifier is not None and os.getenv("MCP_MINIFY", "0") == "1"
+
+
+@lru_cache(maxsize=128)
+def _client_config(repo_name: str, host: str, port: int) -> Dict[str, Any]:
+    """Cursor 与 Claude Desktop 共用的 SSE 客户端配置（纯函数）"""
+    return {
+        "mcpServers": {
+            f"{repo_name}-codebase": {
+                "url": f"http://{host}:{port}/sse"
+            }
         }
-        for tool in MCP_TOOLS
+    }
+
+
+@lru_cache(maxsize=128)
+def _client_config_bytes(repo_name: str, host: str, port: int) -> bytes:
+    """客户端配置的 JSON 字节（两份配置文件共用）"""
+    return orjson.dumps(_client_config(repo_name, host, port), option=orjson.OPT_INDENT_2)
+
+
+@lru_cache(maxsize=128)
+def _readme(repo_name: str, repo_id: str, port: int, host: str) -> bytes:
+    """渲染 MCP 使用说明，返回 UTF-8 字节（纯函数）"""
+    return _format_bytes(
+        _README_TEMPLATE,
+        repo_name=repo_name,
+        repo_id=repo_id,
+        port=port,
+        host=host,
+    )
+
+
+def _generate_all(repo_id: str, port: int, host: str) -> Dict[str, bytes]:
+    """仓库元数据只查询一次，生成 save_mcp_server 需要写入的全部字节内容"""
+    repo_name, languages = _repo_meta(repo_id)
+    return {
+        "server_code": _server_code(repo_name, languages, repo_id, port),
+        "client_config": _client_config_bytes(repo_name, host, port),
+        "readme": _readme(repo_name, repo_id, port, host),
+    }
+
+
+def generate_mcp_server_code(repo_id: str, port: int = 9100) -> str:
+    """
+    生成独立的 MCP Server Python 代码（SSE 远程连接模式）
+    
+    Args:
+        repo_id: 仓库ID
+        port: SSE 服务端口
+    
+    Returns:
+        MCP Server 的 Python 代码
+    """
+    repo_name, languages = _repo_meta(repo_id)
+    return _server_code(repo_name, languages, repo_id, port).decode("utf-8")
+
+
+def generate_cursor_mcp_config(repo_id: str, port: int = 9100, host: str = "localhost") -> Dict[str, Any]:
+    """
+    生成 Cursor MCP 配置（SSE 远程连接模式）
+    
+    Args:
+        repo_id: 仓库ID
+        port: MCP Server SSE 端口
+        host: MCP Server 主机地址
+    
+    Returns:
+        Cursor MCP 配置 JSON
+    """
+    repo_name, _ = _repo_meta(repo_id)
+    return _client_config(repo_name, host, port)
+
+
+def generate_claude_desktop_config(repo_id: str, port: int = 9100, host: str = "localhost") -> Dict[str, Any]:
+    """
+    生成 Claude Desktop MCP 配置（SSE 远程连接模式，与 Cursor 配置相同）
+    """
+    repo_name, _ = _repo_meta(repo_id)
+    return _client_config(repo_name, host, port)
+
+
+# 默认输出目录在导入时解析一次；已创建过的目录记录下来，后续保存不再重复 mkdir
+_DEFAULT_OUTPUT_DIR: Path = Path(__file__).resolve().parents[2] / "workspace" / "mcp"
+_created_dirs: Set[Path] = set()
+
+
+def _ensure_dir(path: Path) -> None:
+    if path not in _created_dirs:
+        path.mkdir(parents=True, exist_ok=True)
+        _created_dirs.add(path)
+
+
+def _content_digest(data: bytes = b"") -> "hashlib.blake2b":
+    return hashlib.blake2b(data, digest_size=16)
+
+
+def _file_digest(path: Path) -> bytes:
+    """计算已有文件的摘要；Python 3.11+ 用 hashlib.file_digest 直接从文件描述符读入哈希，不经 Python 层缓冲"""
+    with open(path, "rb") as f:
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, _content_digest).digest()
+        return _content_digest(f.read()).digest()
+
+
+def _write_if_changed(path: Path, content: bytes) -> bool:
+    """内容与磁盘上的文件一致时跳过写入（避免触发文件监听和 --reload 重启），返回是否写入"""
+    try:
+        if path.stat().st_size == len(content):
+            if _file_digest(path) == _content_digest(content).digest():
+                return False
+    except FileNotFoundError:
+        pass
+    try:
+        path.write_bytes(content)
+    except FileNotFoundError:
+        # 目录在进程运行期间被删除：重建后重试
+        _created_dirs.discard(path.parent)
+        _ensure_dir(path.parent)
+        path.write_bytes(content)
+    return True
+
+
+def save_mcp_server(repo_id: str, output_dir: Optional[str] = None, port: int = 9100, host: str = "localhost") -> Dict[str, Any]:
+    """
+    保存 MCP Server 文件到指定目录
+    
+    Args:
+        repo_id: 仓库ID
+        output_dir: 输出目录，默认为 workspace/mcp
+        port: SSE 服务端口
+        host: 主机地址（用于生成配置）
+    
+    Returns:
+        生成的文件路径信息和端口；changed 列出本次实际写入的文件键名，
+        为空表示内容未变化、无需重启服务
+    """
+    output_path = _DEFAULT_OUTPUT_DIR if output_dir is None else Path(output_dir)
+    _ensure_dir(output_path)
+    
+    # 生成 MCP Server 代码、Cursor / Claude Desktop 配置和 README
+    server_file = output_path / f"mcp_server_{repo_id}.py"
+    cursor_file = output_path / f"cursor_config_{repo_id}.json"
+    claude_file = output_path / f"claude_config_{repo_id}.json"
+    readme_file = output_path / f"README_{repo_id}.md"
+    # 生成结果已是缓存的字节，Cursor 与 Claude Desktop 配置内容相同、共用一份
+    generated = _generate_all(repo_id, port, host)
+    server_code = generated["server_code"]
+    writes = [
+        ("cursor_config", cursor_file, generated["client_config"]),
+        ("claude_config", claude_file, generated["client_config"]),
+        ("readme", readme_file, generated["readme"]),
     ]
+    if _minify_enabled():
+        # 压缩版用于运行，未压缩的原始代码另存为 .debug.py 便于排查
+        writes.append(("server_debug", output_path / f"mcp_server_{repo_id}.debug.py", server_code))
+        server_code = _minify_server_code(server_code)
+    writes.insert(0, ("server_file", server_file, server_code))
+    
+    # 四个文件并发检查、写入，网络文件系统上可重叠往返延迟
+    with ThreadPoolExecutor(max_workers=len(writes)) as executor:
+        written = list(executor.map(lambda item: _write_if_changed(item[1], item[2]), writes))
+    changed = [key for (key, _, _), was_written in zip(writes, written) if was_written]
+    
+    return {
+        "server_file": str(server_file),
+        "cursor_config": str(cursor_file),
+        "claude_config": str(claude_file),
+        "readme": str(readme_file),
+        "port": port,
+        "sse_url": f"http://{host}:{port}/sse",
+        "changed": changed,
+    }
+
+
+def save_mcp_servers_bulk(
+    repo_ids: List[str],
+    output_dir: Optional[str] = None,
+    port_base: int = 9100,
+    host: str = "localhost",
+) -> List[Dict[str, Any]]:
+    """
+    批量为多个仓库生成 MCP Server 文件
+
+    各仓库并发生成、写入，第 i 个仓库使用端口 port_base + i。
+
+    Returns:
+        与 repo_ids 顺序一致的 save_mcp_server 结果列表
+    """
+    if not repo_ids:
+        return []
+    with ThreadPoolExecutor(max_workers=min(16, len(repo_ids))) as executor:
+        return list(executor.map(
+            lambda item: save_mcp_server(item[1], output_dir, port_base + item[0], host),
+            enumerate(repo_ids),
+        ))
+
+
+def generate_mcp_readme(repo_id: str, port: int = 9100, host: str = "localhost") -> str:
+    """生成 MCP 使用说明（SSE 远程连接模式）"""
+    repo_name, _ = _repo_meta(repo_id)
+    return _readme(repo_name, repo_id, port, host).decode("utf-8")
+
+
+def get_mcp_tools_list() -> List[Dict[str, Any]]:
+    """获取 MCP 工具列表（用于 API 展示；返回共享的预计算结果，调用方不要修改）"""
+    return _MCP_TOOLS_LIST
+
+
+def get_mcp_tools_json_bytes() -> bytes:
+    """工具列表接口的 JSON 响应体 {"tools": [...]}（导入时序列化一次）"""
+    return _MCP_TOOLS_JSON
@@ -1,61 +1,139 @@
 from __future__ import annotations
 
+import atexit
 import os
 import sys
 import subprocess
 import json
 import platform
 import signal
+import threading
 import time
+import weakref
 from pathlib import Path
 from typing import Dict, Optional, Any
 
 from app.services.mcp_generator import save_mcp_server
 import requests
+from requests.adapters import HTTPAdapter
+
+try:  # 进程内读取监听端口，避免 fork lsof/ss/netstat
+    import psutil
+except ImportError:
+    psutil = None
 
 
 # 进程和端口管理
 _processes: Dict[str, subprocess.Popen] = {}
 _port_registry: Dict[str, int] = {}  # repo_id -> port
+_port_file_mtime: Optional[int] = None  # 内存中注册表对应的文件 st_mtime_ns
+_registry_lock = threading.RLock()
+# 批量分配时合并写盘：标记脏数据，最多每 _REGISTRY_FLUSH_INTERVAL 秒写一次
+_REGISTRY_FLUSH_INTERVAL = 2.0
+_registry_dirty = False
+_last_flush_ts = 0.0
+_flush_timer: Optional[threading.Timer] = None
 
 # 端口范围配置
 MCP_PORT_START = 9100
 MCP_PORT_END = 9199
+_PORT_RANGE = frozenset(range(MCP_PORT_START, MCP_PORT_END + 1))
 
 # 持久化文件路径
 _port_file = Path(__file__).resolve().parents[2] / "workspace" / "mcp" / "port_registry.json"
 
 
+def _build_health_session() -> requests.Session:
+    """健康检查共用的 Session，轮询同一端口时复用 keep-alive 连接"""
+    session = requests.Session()
+    # 不做重试：探测失败本身就是"未运行"的信号
+    adapter = HTTPAdapter(pool_connections=32, pool_maxsize=64)
+    session.mount("http://", adapter)
+    return session
+
+
+_HEALTH_SESSION = _build_health_session()
+atexit.register(_HEALTH_SESSION.close)
+
+
 def _load_port_registry():
-    """加载端口注册表"""
-    global _port_registry
-    if _port_file.exists():
+    """加载端口注册表（文件 mtime 未变化时直接使用内存中的副本）"""
+    global _port_registry, _port_file_mtime
+    with _registry_lock:
+        try:
+            mtime = _port_file.stat().st_mtime_ns
+        except OSError:
+            return
+        # 有未写盘的修改时以内存为准
+        if _registry_dirty or mtime == _port_file_mtime:
+            return
         try:
             _port_registry = json.loads(_port_file.read_text(encoding="utf-8"))
         except Exception:
             _port_registry = {}
+        _port_file_mtime = mtime
+
+
+def _flush_port_registry():
+    """把未写盘的注册表原子写入文件（临时文件 + os.replace）"""
+    global _port_file_mtime, _registry_dirty, _last_flush_ts, _flush_timer
+    with _registry_lock:
+        _flush_timer = None
+        if not _registry_dirty:
+            return
+        _port_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = _port_file.with_name(_port_file.name + ".tmp")
+        tmp_file.write_text(json.dumps(_port_registry, indent=2), encoding="utf-8")
+        os.replace(tmp_file, _port_file)
+        _port_file_mtime = _port_file.stat().st_mtime_ns
+        _registry_dirty = False
+        _last_flush_ts = time.monotonic()
+
+
+def _save_port_registry(immediate: bool = False):
+    """
+    保存端口注册表
 
+    immediate 为 True 时立即写盘；否则距上次写盘不足间隔时延后合并写入，供批量或延迟的调用方使用。
+    """
+    global _registry_dirty, _flush_timer
+    with _registry_lock:
+        _registry_dirty = True
+        wait = _REGISTRY_FLUSH_INTERVAL - (time.monotonic() - _last_flush_ts)
+        if immediate or wait <= 0:
+            if _flush_timer is not None:
+                _flush_timer.cancel()
+            _flush_port_registry()
+        elif _flush_timer is None:
+            _flush_timer = threading.Timer(wait, _flush_port_registry)
+            _flush_timer.daemon = True
+            _flush_timer.start()
 
-def _save_port_registry():
-    """保存端口注册表"""
-    _port_file.parent.mkdir(parents=True, exist_ok=True)
-    _port_file.write_text(json.dumps(_port_registry, indent=2), encoding="utf-8")
 
+atexit.register(_flush_port_registry)
 
-def _allocate_port(repo_id: str) -> int:
-    """为 repo 分配端口"""
-    _load_port_registry()
-    
-    # 如果已分配，返回现有端口
-    if repo_id in _port_registry:
-        return _port_registry[repo_id]
-    
-    # 分配新端口
-    used_ports = set(_port_registry.values())
-    for port in range(MCP_PORT_START, MCP_PORT_END + 1):
-        if port not in used_ports:
+
+def _allocate_port(repo_id: str, immediate: bool = True) -> int:
+    """
+    为 repo 分配端口
+
+    默认分配后立即写盘：启动流程马上会在该端口拉起子进程并把端口返回给客户端，
+    若分配只留在内存中，进程在合并写盘前崩溃会丢失记录，之后可能把同一端口分给别的仓库。
+    批量预分配等不立即使用端口的调用方可传 immediate=False 合并写盘。
+    """
+    with _registry_lock:
+        _load_port_registry()
+        
+        # 如果已分配，返回现有端口
+        if repo_id in _port_registry:
+            return _port_registry[repo_id]
+        
+        # 分配最小的空闲端口（端口范围减去已登记的端口）
+        free_ports = _PORT_RANGE.difference(_port_registry.values())
+        if free_ports:
+            port = min(free_ports)
             _port_registry[repo_id] = port
-            _save_port_registry()
+            _save_port_registry(immediate=immediate)
             return port
     
     # 端口用尽，抛出异常
@@ -64,12 +142,39 @@ def _allocate_port(repo_id: str) -> int:
 
 def _get_port(repo_id: str) -> Optional[int]:
     """获取 repo 的端口"""
-    _load_port_registry()
-    return _port_registry.get(repo_id)
+    with _registry_lock:
+        _load_port_registry()
+        return _port_registry.get(repo_id)
+
+
+# 进程存活检查结果的短暂缓存：proc -> 上次确认仍在运行的时间
+_RUNNING_CHECK_TTL = 0.2
+_running_checked_at: "weakref.WeakKeyDictionary[subprocess.Popen, float]" = weakref.WeakKeyDictionary()
 
 
 def _is_running(proc: Optional[subprocess.Popen]) -> bool:
-    return proc is not None and proc.poll() is None
+    """直接 poll() 确认进程存活；启动、停止等决策路径必须用这个，不能用缓存结果"""
+    if proc is None:
+        return False
+    # 已退出的进程 returncode 会被 Popen 记住，poll() 不再产生系统调用
+    if proc.poll() is None:
+        return True
+    _running_checked_at.pop(proc, None)
+    return False
+
+
+def _is_running_cached(proc: Optional[subprocess.Popen]) -> bool:
+    """仅供状态接口使用：频繁轮询时 200ms 内复用上次 poll() 结果，减少 waitpid 调用"""
+    if proc is None:
+        return False
+    now = time.monotonic()
+    checked_at = _running_checked_at.get(proc)
+    if checked_at is not None and now - checked_at < _RUNNING_CHECK_TTL:
+        return True
+    if _is_running(proc):
+        _running_checked_at[proc] = now
+        return True
+    return False
 
 
 def _get_health_info(port: Optional[int], host: str = "localhost") -> Optional[Dict[str, Any]]:
@@ -77,7 +182,7 @@ def _get_health_info(port: Optional[int], host: str = "localhost") -> Optional[D
     if not port:
         return None
     try:
-        res = requests.get(f"http://{host}:{port}/health", timeout=0.5)
+        res = _HEALTH_SESSION.get(f"http://{host}:{port}/health", timeout=0.5)
         if res.status_code != 200:
             return None
         return res.json() if res.content else {"status": "ok"}
@@ -92,6 +197,21 @@ def _is_port_healthy(port: Optional[int], host: str = "localhost") -> bool:
 
 def _find_pids_by_port(port: int) -> set[int]:
     """根据端口查找监听进程 PID（跨平台尽力而为）"""
+    if psutil is not None:
+        try:
+            return {
+                conn.pid
+                for conn in psutil.net_connections(kind="tcp")
+                if conn.pid and conn.status == psutil.CONN_LISTEN and conn.laddr and conn.laddr.port == port
+            }
+        except Exception:
+            # 如 macOS 非 root 用户无权枚举连接，退回外部命令
+            pass
+    return _find_pids_by_port_cmd(port)
+
+
+def _find_pids_by_port_cmd(port: int) -> set[int]:
+    """通过 netstat / lsof / ss 命令查找监听进程 PID"""
     pids: set[int] = set()
     system = platform.system().lower()
     try:
@@ -221,15 +341,18 @@ def start_mcp_server(repo_id: str, api_base: Optional[str] = None, host: str = "
     log_dir.mkdir(parents=True, exist_ok=True)
     log_file = log_dir / f"mcp_{repo_id}.log"
     
-    log_handle = open(log_file, "a", encoding="utf-8")
-    proc = subprocess.Popen(
-        [sys.executable, server_file],
-        cwd=str(Path(server_file).parent),
-        env=env,
-        stdout=log_handle,
-        stderr=log_handle,
-        creationflags=creationflags,
-    )
+    # POSIX 上不传 cwd 且 close_fds=False 时 subprocess 走 posix_spawn 而不是 fork+exec，
+    # 后端进程内存较大时启动更快；PEP 446 下父进程的 fd 默认不可继承，不会泄漏给子进程。
+    # 生成的 Server 不依赖工作目录。
+    with open(log_file, "a", encoding="utf-8") as log_handle:
+        proc = subprocess.Popen(
+            [sys.executable, server_file],
+            env=env,
+            stdout=log_handle,
+            stderr=log_handle,
+            close_fds=os.name != "posix",
+            creationflags=creationflags,
+        )
     _processes[repo_id] = proc
     
     return {
@@ -242,6 +365,7 @@ def start_mcp_server(repo_id: str, api_base: Optional[str] = None, host: str = "
 
 def stop_mcp_server(repo_id: str) -> Dict[str, Any]:
     """停止 MCP Server"""
+    _flush_port_registry()
     proc = _processes.get(repo_id)
     if not _is_running(proc):
         port = _get_port(repo_id)
@@ -268,6 +392,24 @@ def stop_mcp_server(repo_id: str) -> Dict[str, Any]:
     return {"running": False}
 
 
+def release_mcp_port(repo_id: str) -> None:
+    """
+    仓库删除时调用：停止其 MCP 服务并回收端口，供其他仓库复用
+
+    仅停止服务时不回收，保证重启后端口不变、已下发的客户端配置继续有效。
+    """
+    stop_mcp_server(repo_id)
+    with _registry_lock:
+        _load_port_registry()
+        if _port_registry.pop(repo_id, None) is not None:
+            _save_port_registry()
+
+
+def get_mcp_port(repo_id: str) -> Optional[int]:
+    """只查询已分配的端口（读注册表），不做进程检查和健康探测"""
+    return _get_port(repo_id)
+
+
 def get_mcp_status(repo_id: str, host: str = "localhost") -> Dict[str, Any]:
     """
     获取 MCP Server 状态
@@ -278,7 +420,7 @@ def get_mcp_status(repo_id: str, host: str = "localhost") -> Dict[str, Any]:
     proc = _processes.get(repo_id)
     port = _get_port(repo_id)
     
-    if _is_running(proc):
+    if _is_running_cached(proc):
         return {
             "running": True,
             "pid": proc.pid,
@@ -1,7 +1,7 @@
 ﻿from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Tuple
 
 from app.services.module_tree import ModuleNode, ModuleTree
 from app.services.parsers import Symbol
@@ -16,23 +16,39 @@ class ModuleAssignment:
 
 def index_nodes(root: ModuleNode) -> Dict[str, ModuleNode]:
     index: Dict[str, ModuleNode] = {}
-
-    def walk(node: ModuleNode):
+    # 显式栈做先序遍历（子节点逆序入栈，访问顺序与递归一致），深层目录树不会触发 RecursionError
+    stack = [root]
+    while stack:
+        node = stack.pop()
         index[node.path_prefix] = node
-        for child in node.children:
-            walk(child)
-
-    walk(root)
+        stack.extend(reversed(node.children))
     return index
 
 
-def _best_prefix(path: str, prefixes: List[str]) -> str:
-    best = ""
+def _build_prefix_trie(prefixes: Iterable[str]) -> Dict:
+    """按路径分段构建前缀树，节点的 None 键保存对应的模块前缀"""
+    trie: Dict = {}
     for prefix in prefixes:
         if not prefix:
             continue
-        if path.startswith(prefix) and len(prefix) > len(best):
-            best = prefix
+        node = trie
+        for part in prefix.strip("/").split("/"):
+            node = node.setdefault(part, {})
+        # 同一路径的不同写法（如带尾部斜杠）保留最长的一个
+        if len(prefix) > len(node.get(None, "")):
+            node[None] = prefix
+    return trie
+
+
+def _best_prefix(path: str, trie: Dict) -> str:
+    """沿路径分段下行，返回最深的匹配模块前缀（O(路径深度)）"""
+    best = ""
+    node = trie
+    for part in path.split("/"):
+        node = node.get(part)
+        if node is None:
+            break
+        best = node.get(None, best)
     return best
 
 
@@ -43,7 +59,7 @@ def assign_files_and_symbols(
 ) -> List[ModuleAssignment]:
     root_prefix = repo_root.replace("\\", "/").rstrip("/")
     index = index_nodes(tree.root)
-    prefixes = sorted(index.keys(), key=len)
+    prefix_trie = _build_prefix_trie(index)
 
     file_to_symbols: Dict[str, List[str]] = {}
     for sym_id, sym in symbols:
@@ -54,7 +70,7 @@ def assign_files_and_symbols(
         rel = file_path.replace("\\", "/")
         if rel.startswith(root_prefix + "/"):
             rel = rel[len(root_prefix) + 1 :]
-        module_prefix = _best_prefix(rel, prefixes)
+        module_prefix = _best_prefix(rel, prefix_trie)
         module_id = module_prefix if module_prefix in index else "root"
         assignments.append(ModuleAssignment(module_id=module_id, file_path=file_path, symbol_ids=sym_ids))
 
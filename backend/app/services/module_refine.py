@@ -1,5 +1,6 @@
 ﻿from __future__ import annotations
 
+from collections import defaultdict
 from dataclasses import dataclass
 from typing import Dict, List, Tuple
 
@@ -23,28 +24,29 @@ def refine_module_tree(
     parent_edge_ratio: float = 0.6,
 ) -> RefineResult:
     parent_map: Dict[str, str] = {}
-
-    def walk(node: ModuleNode, parent: ModuleNode | None):
+    stack: List[Tuple[ModuleNode, ModuleNode | None]] = [(tree.root, None)]
+    while stack:
+        node, parent = stack.pop()
         if parent is not None:
             parent_map[node.path_prefix] = parent.path_prefix
-        for child in node.children:
-            walk(child, node)
-
-    walk(tree.root, None)
+        stack.extend((child, node) for child in reversed(node.children))
 
     file_to_module: Dict[str, str] = {}
-    module_files: Dict[str, List[str]] = {}
+    module_files: Dict[str, List[str]] = defaultdict(list)
     for item in assignments:
         file_to_module[item.file_path] = item.module_id
-        module_files.setdefault(item.module_id, []).append(item.file_path)
+        module_files[item.module_id].append(item.file_path)
 
-    module_edge_counts: Dict[Tuple[str, str], int] = {}
+    # 边计数时顺带累计每个模块的出边总数，避免在模块循环里反复扫描全部边
+    module_edge_counts: Dict[Tuple[str, str], int] = defaultdict(int)
+    out_totals: Dict[str, int] = defaultdict(int)
     for edge in file_deps:
         src_mod = file_to_module.get(edge.src)
         dst_mod = file_to_module.get(edge.dst)
         if not src_mod or not dst_mod or src_mod == dst_mod:
             continue
-        module_edge_counts[(src_mod, dst_mod)] = module_edge_counts.get((src_mod, dst_mod), 0) + 1
+        module_edge_counts[(src_mod, dst_mod)] += 1
+        out_totals[src_mod] += 1
 
     merge_map: Dict[str, str] = {}
     for module_id, files in module_files.items():
@@ -54,7 +56,7 @@ def refine_module_tree(
         if not parent_id:
             continue
 
-        total_edges = sum(count for (src, _), count in module_edge_counts.items() if src == module_id)
+        total_edges = out_totals.get(module_id, 0)
         parent_edges = module_edge_counts.get((module_id, parent_id), 0)
         file_count = len(files)
 
@@ -79,17 +81,24 @@ def refine_module_tree(
             )
         )
 
-    def prune(node: ModuleNode) -> ModuleNode:
-        children = [prune(child) for child in node.children if child.path_prefix not in merge_map]
-        return ModuleNode(
+    # 先序收集保留的节点，再逆序自底向上重建，子节点总在父节点之前完成
+    order: List[ModuleNode] = []
+    stack = [tree.root]
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        stack.extend(child for child in reversed(node.children) if child.path_prefix not in merge_map)
+
+    pruned: Dict[int, ModuleNode] = {}
+    for node in reversed(order):
+        pruned[id(node)] = ModuleNode(
             id=node.id,
             name=node.name,
             path_prefix=node.path_prefix,
             files=node.files,
-            children=children,
+            children=[pruned[id(child)] for child in node.children if child.path_prefix not in merge_map],
         )
-
-    pruned_root = prune(tree.root)
+    pruned_root = pruned[id(tree.root)]
 
     for item in new_assignments:
         if item.module_id == pruned_root.path_prefix:
@@ -26,21 +26,27 @@ def build_module_tree(repo_root: str, files: List[DiscoveredFile]) -> ModuleTree
     root = ModuleNode(id="root", name="root", path_prefix="")
     nodes: Dict[str, ModuleNode] = {"": root}
 
+    # discover_files 产出的路径都在解析后的根目录下，按字符串去掉前缀即可，不必逐个 resolve()
+    root_prefix = root_path.as_posix().rstrip("/") + "/"
     for item in files:
-        rel_path = Path(item.path).resolve().relative_to(root_path).as_posix()
-        parts = rel_path.split("/")[:-1]
-        prefix = ""
-        for part in parts:
-            prefix = f"{prefix}/{part}".strip("/")
-            if prefix not in nodes:
-                nodes[prefix] = ModuleNode(id=prefix, name=part, path_prefix=prefix)
-                parent_prefix = "/".join(prefix.split("/")[:-1])
-                parent = nodes.get(parent_prefix, root)
-                parent.children.append(nodes[prefix])
-
-        nodes[""].files.append(item.path)
-        if parts:
-            leaf_prefix = "/".join(parts)
+        rel_path = item.path.replace("\\", "/")
+        if rel_path.startswith(root_prefix):
+            rel_path = rel_path[len(root_prefix):]
+        else:
+            rel_path = Path(item.path).resolve().relative_to(root_path).as_posix()
+        leaf_prefix = rel_path.rpartition("/")[0]
+        # 目录已建好时直接挂文件；否则逐级补建缺失的祖先节点，父节点用 rpartition 一次定位
+        if leaf_prefix not in nodes:
+            prefix = ""
+            for part in leaf_prefix.split("/"):
+                prefix = f"{prefix}/{part}" if prefix else part
+                if prefix not in nodes:
+                    node = ModuleNode(id=prefix, name=part, path_prefix=prefix)
+                    nodes[prefix] = node
+                    nodes.get(prefix.rpartition("/")[0], root).children.append(node)
+
+        root.files.append(item.path)
+        if leaf_prefix:
             nodes[leaf_prefix].files.append(item.path)
 
     return ModuleTree(root=root)
@@ -1,13 +1,14 @@
 from __future__ import annotations
 
 import json
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
 from app.services.module_tree import ModuleNode, ModuleTree
 
 
 def module_tree_from_codewiki(tree: Dict, symbol_map: Optional[Dict[str, Dict]] = None) -> ModuleTree:
-    def build_node(name: str, info: Dict) -> ModuleNode:
+    def make_node(name: str, info: Dict) -> ModuleNode:
+        """只处理节点自身的 components，子模块文件在第二遍汇总"""
         path_prefix = info.get("path") or name
         node = ModuleNode(id=path_prefix, name=name, path_prefix=path_prefix)
         components = info.get("components", [])
@@ -21,15 +22,23 @@ def module_tree_from_codewiki(tree: Dict, symbol_map: Optional[Dict[str, Dict]]
                 if file_path:
                     files.add(file_path)
             node.files.extend(sorted(files))
-        for child_name, child_info in info.get("children", {}).items():
-            child_node = build_node(child_name, child_info)
-            node.children.append(child_node)
-            node.files.extend(child_node.files)
         return node
 
     root = ModuleNode(id="root", name="root", path_prefix="")
-    for name, info in tree.items():
-        root.children.append(build_node(name, info))
+    # 显式栈先序建树（兄弟节点逆序入栈以保持原顺序），再逆序把子模块文件并入父模块
+    order: List[ModuleNode] = []
+    stack = [(root, name, info) for name, info in reversed(list(tree.items()))]
+    while stack:
+        parent, name, info = stack.pop()
+        node = make_node(name, info)
+        parent.children.append(node)
+        order.append(node)
+        children = info.get("children", {})
+        stack.extend((node, child_name, children[child_name]) for child_name in reversed(list(children)))
+
+    for node in reversed(order):
+        for child in node.children:
+            node.files.extend(child.files)
     return ModuleTree(root=root)
 
 
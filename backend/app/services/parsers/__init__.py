@@ -1,6 +1,6 @@
 ﻿from app.services.parsers.python_parser import parse_python_file
 from app.services.parsers.java_parser import parse_java_file
 from app.services.parsers.base import Symbol, ImportRef
-from app.services.parsers.ids import symbol_id
+from app.services.parsers.ids import symbol_id, symbol_ids_batch
 
-__all__ = ["parse_python_file", "parse_java_file", "Symbol", "ImportRef", "symbol_id"]
+__all__ = ["parse_python_file", "parse_java_file", "Symbol", "ImportRef", "symbol_id", "symbol_ids_batch"]
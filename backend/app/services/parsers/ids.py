@@ -1,20 +1,30 @@
 ﻿from __future__ import annotations
 
 import hashlib
+from typing import Iterable, List
 
 from app.services.parsers.base import Symbol
 
 
 def symbol_id(symbol: Symbol) -> str:
-    payload = "|".join(
-        [
-            symbol.file_path,
-            symbol.kind,
-            symbol.name,
-            str(symbol.line_start),
-            str(symbol.line_end),
-            symbol.container or "",
-            symbol.signature or "",
-        ]
+    # 一次格式化 + 一次编码；blake2b 取 20 字节，ID 仍是 40 位十六进制
+    payload = (
+        f"{symbol.file_path}|{symbol.kind}|{symbol.name}|{symbol.line_start}|{symbol.line_end}"
+        f"|{symbol.container or ''}|{symbol.signature or ''}"
     )
-    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=20).hexdigest()
+
+
+def symbol_ids_batch(symbols: Iterable[Symbol]) -> List[str]:
+    """批量计算 symbol_id，结果与逐个调用一致；省去逐个调用的函数开销和属性查找"""
+    blake2b = hashlib.blake2b
+    return [
+        blake2b(
+            (
+                f"{sym.file_path}|{sym.kind}|{sym.name}|{sym.line_start}|{sym.line_end}"
+                f"|{sym.container or ''}|{sym.signature or ''}"
+            ).encode("utf-8"),
+            digest_size=20,
+        ).hexdigest()
+        for sym in symbols
+    ]
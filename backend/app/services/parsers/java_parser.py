@@ -1,68 +1,80 @@
 ﻿from __future__ import annotations
 
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Tuple
 
-from tree_sitter_language_pack import get_parser
+from tree_sitter import Query
+from tree_sitter_language_pack import get_language
 
 from app.services.parsers.base import Symbol, ImportRef
-from app.services.parsers.utils import node_name, node_location, node_text
+from app.services.parsers.utils import (
+    Source,
+    enclosing_name,
+    node_location,
+    node_name,
+    node_text,
+    parse_source,
+    preorder,
+    query_captures,
+    source_buffer,
+    thread_parser,
+)
+
+_QUERY_SOURCE = """
+(class_declaration) @class
+(interface_declaration) @class
+(enum_declaration) @class
+(method_declaration) @method
+(import_declaration) @import
+"""
+
+_CONTAINER_TYPES = frozenset({"class_declaration", "interface_declaration", "enum_declaration"})
+
+
+@lru_cache(maxsize=None)
+def _query():
+    return Query(get_language("java"), _QUERY_SOURCE)
 
 
 def parse_java_file(file_path: str) -> Tuple[List[Symbol], List[ImportRef]]:
     path = Path(file_path)
-    source = path.read_bytes()
-    parser = get_parser("java")
-    tree = parser.parse(source)
+    with source_buffer(path) as source:
+        return _extract(source, str(path))
+
+
+def _extract(source: Source, path_str: str) -> Tuple[List[Symbol], List[ImportRef]]:
+    tree = parse_source(thread_parser("java"), source)
+    # 由 tree-sitter 查询在 C 层定位目标节点，Python 只处理命中的节点
+    captures = query_captures(_query(), tree.root_node)
 
     symbols: List[Symbol] = []
     imports: List[ImportRef] = []
 
-    def walk(node, container: str | None = None):
-        if node.type in {"class_declaration", "interface_declaration", "enum_declaration"}:
-            name = node_name(source, node) or "<anonymous>"
-            line_start, line_end = node_location(node)
-            symbols.append(
-                Symbol(
-                    kind="class",
-                    name=name,
-                    file_path=str(path),
-                    line_start=line_start,
-                    line_end=line_end,
-                    container=container,
-                )
-            )
-            container = name
-
-        if node.type == "method_declaration":
-            name = node_name(source, node) or "<anonymous>"
-            line_start, line_end = node_location(node)
-            symbols.append(
-                Symbol(
-                    kind="method",
-                    name=name,
-                    file_path=str(path),
-                    line_start=line_start,
-                    line_end=line_end,
-                    container=container,
-                )
+    for node in preorder(captures.get("class", []) + captures.get("method", [])):
+        name = node_name(source, node) or "<anonymous>"
+        line_start, line_end = node_location(node)
+        symbols.append(
+            Symbol(
+                kind="method" if node.type == "method_declaration" else "class",
+                name=name,
+                file_path=path_str,
+                line_start=line_start,
+                line_end=line_end,
+                container=enclosing_name(source, node, _CONTAINER_TYPES),
             )
+        )
 
-        if node.type == "import_declaration":
-            text = node_text(source, node)
-            line_start, line_end = node_location(node)
-            imports.append(
-                ImportRef(
-                    module=text.strip(),
-                    name=None,
-                    file_path=str(path),
-                    line_start=line_start,
-                    line_end=line_end,
-                )
+    for node in preorder(captures.get("import", [])):
+        line_start, line_end = node_location(node)
+        imports.append(
+            ImportRef(
+                module=node_text(source, node).strip(),
+                name=None,
+                file_path=path_str,
+                line_start=line_start,
+                line_end=line_end,
             )
+        )
 
-        for child in node.children:
-            walk(child, container)
-
-    walk(tree.root_node)
     return symbols, imports
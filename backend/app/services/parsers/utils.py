@@ -1,13 +1,59 @@
 ﻿from __future__ import annotations
 
-from typing import Optional
+import mmap
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
 
+from tree_sitter_language_pack import get_parser
 
-def node_text(source: bytes, node) -> str:
+try:  # tree-sitter >= 0.25 通过 QueryCursor 执行查询
+    from tree_sitter import QueryCursor
+except ImportError:
+    QueryCursor = None
+
+# 超过该大小的源文件用 mmap 读取，避免整份复制到内存
+_MMAP_THRESHOLD = 1 << 20
+_READ_CHUNK = 64 * 1024
+
+Source = Union[bytes, mmap.mmap]
+
+# Parser 带有解析状态，不能跨线程共享；每个线程按语言各持有一个并在逐文件解析时复用
+_PARSERS = threading.local()
+
+
+def thread_parser(lang: str):
+    """当前线程的 lang 解析器，首次使用时创建"""
+    parser = getattr(_PARSERS, lang, None)
+    if parser is None:
+        parser = get_parser(lang)
+        setattr(_PARSERS, lang, parser)
+    return parser
+
+
+@contextmanager
+def source_buffer(path: Path) -> Iterator[Source]:
+    """小文件直接读成 bytes；大文件以只读 mmap 提供，由操作系统按需换页"""
+    if path.stat().st_size < _MMAP_THRESHOLD:
+        yield path.read_bytes()
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        yield mm
+
+
+def parse_source(parser, source: Source):
+    """bytes 直接解析；mmap 通过读回调分块交给 tree-sitter"""
+    if isinstance(source, bytes):
+        return parser.parse(source)
+    return parser.parse(lambda byte_offset, _point: source[byte_offset:byte_offset + _READ_CHUNK])
+
+
+def node_text(source: Source, node) -> str:
     return source[node.start_byte:node.end_byte].decode("utf-8", errors="replace")
 
 
-def node_name(source: bytes, node) -> Optional[str]:
+def node_name(source: Source, node) -> Optional[str]:
     name_node = node.child_by_field_name("name")
     if name_node is None:
         return None
@@ -18,3 +64,25 @@ def node_location(node) -> tuple[int, int]:
     line_start = int(node.start_point[0]) + 1
     line_end = int(node.end_point[0]) + 1
     return line_start, line_end
+
+
+def query_captures(query, node) -> Dict[str, List]:
+    """在 C 层一次扫描语法树，返回 {capture 名: 节点列表}"""
+    if QueryCursor is not None:
+        return QueryCursor(query).captures(node)
+    return query.captures(node)
+
+
+def preorder(nodes) -> List:
+    """按源码位置排序，外层节点排在内层之前（与先序遍历顺序一致）"""
+    return sorted(nodes, key=lambda node: (node.start_byte, -node.end_byte))
+
+
+def enclosing_name(source: Source, node, types) -> Optional[str]:
+    """最近一层类型在 types 中的祖先节点名称，没有则返回 None"""
+    parent = node.parent
+    while parent is not None:
+        if parent.type in types:
+            return node_name(source, parent) or "<anonymous>"
+        parent = parent.parent
+    return None
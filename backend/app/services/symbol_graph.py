@@ -1,17 +1,40 @@
 ﻿from __future__ import annotations
 
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Iterable, List
+from typing import Dict, Iterable, List, Optional, Tuple
 import re
 
-from tree_sitter_language_pack import get_parser
+from tree_sitter import Query
+from tree_sitter_language_pack import get_language
 
-from app.services.parsers import Symbol, symbol_id
-from app.services.parsers.utils import node_location, node_name, node_text
+from app.services.parsers import Symbol, symbol_ids_batch
+from app.services.parsers.utils import preorder, query_captures, thread_parser
 
+_PY_QUERY_SOURCE = """
+(class_definition) @container
+(function_definition) @container
+(call) @call
+(attribute) @attribute
+"""
 
-@dataclass(frozen=True)
+_NAME_RE = re.compile(rb"[A-Za-z_][A-Za-z0-9_.]*", re.ASCII)
+
+_JAVA_CLASS_TYPES = frozenset({"class_declaration", "interface_declaration", "enum_declaration"})
+
+_JAVA_QUERY_SOURCE = """
+(class_declaration) @container
+(interface_declaration) @container
+(enum_declaration) @container
+(method_declaration) @container
+(method_invocation) @call
+(object_creation_expression) @call
+(field_access) @field_access
+"""
+
+
+@dataclass(frozen=True, slots=True)
 class SymbolDependency:
     src_symbol_id: str
     dst_symbol_id: str
@@ -19,163 +42,215 @@ class SymbolDependency:
     detail: str
 
 
-def _symbol_map(symbols: Iterable[Symbol]) -> Dict[str, str]:
-    return {sym.name: symbol_id(sym) for sym in symbols}
+# (src_symbol_id, dst_symbol_id, edge_type, detail)，字段顺序与 SymbolDependency 一致
+EdgeRow = Tuple[str, str, str, str]
+
+
+@lru_cache(maxsize=None)
+def _python_query():
+    return Query(get_language("python"), _PY_QUERY_SOURCE)
+
 
+@lru_cache(maxsize=None)
+def _java_query():
+    return Query(get_language("java"), _JAVA_QUERY_SOURCE)
 
-def _extract_names(raw: str) -> List[str]:
+
+def _symbol_map(symbols: Iterable[Symbol]) -> Dict[bytes, str]:
+    # 键为 UTF-8 编码的符号名，遍历语法树时直接用源码字节切片查找，无需逐个解码
+    symbols = list(symbols)
+    return dict(zip([sym.name.encode() for sym in symbols], symbol_ids_batch(symbols)))
+
+
+def _extract_names(raw: bytes) -> List[bytes]:
+    # 直接在源码字节切片上匹配，返回去掉限定前缀后的名称字节
     if not raw:
         return []
-    tokens = re.findall(r"[A-Za-z_][A-Za-z0-9_\.]*", raw)
-    return [t.split(".")[-1] for t in tokens]
+    return [t.rsplit(b".", 1)[-1] for t in _NAME_RE.findall(raw)]
 
 
-def _python_symbol_edges(file_path: str, symbols: List[Symbol]) -> List[SymbolDependency]:
-    source = Path(file_path).read_bytes()
-    parser = get_parser("python")
-    tree = parser.parse(source)
+def _name_bytes(source: bytes, node) -> Optional[bytes]:
+    name_node = node.child_by_field_name("name")
+    if name_node is None:
+        return None
+    return source[name_node.start_byte:name_node.end_byte]
+
+
+def _captured_nodes(query, root, names: Tuple[str, ...]) -> List:
+    # 由 tree-sitter 查询在 C 层定位目标节点，按先序排列后在 Python 中只处理命中的节点
+    captures = query_captures(query, root)
+    nodes: List = []
+    for name in names:
+        nodes.extend(captures.get(name, []))
+    return preorder(nodes)
 
-    name_to_id = _symbol_map(symbols)
-    edges: List[SymbolDependency] = []
-    container_stack: List[str] = []
 
-    def current_container() -> str | None:
-        if not container_stack:
-            return None
-        return container_stack[-1]
+def _python_symbol_edges(
+    file_path: str,
+    symbols: List[Symbol],
+    source: Optional[bytes] = None,
+    tree=None,
+) -> List[EdgeRow]:
+    if source is None:
+        source = Path(file_path).read_bytes()
+    if tree is None:
+        tree = thread_parser("python").parse(source)
 
-    def add_edge(target_name: str, edge_type: str, detail: str) -> None:
-        src_name = current_container()
-        if not src_name or target_name not in name_to_id:
+    name_to_id = _symbol_map(symbols)
+    edges: List[EdgeRow] = []
+    # (容器结束字节, 容器名)；后续节点从该位置之后开始时说明已离开该容器
+    container_stack: List[Tuple[int, bytes]] = []
+
+    def add_edge(target_name: bytes, edge_type: str, detail: bytes) -> None:
+        if not container_stack or target_name not in name_to_id:
             return
         edges.append(
-            SymbolDependency(
-                src_symbol_id=name_to_id[src_name],
-                dst_symbol_id=name_to_id[target_name],
-                edge_type=edge_type,
-                detail=detail,
+            (
+                name_to_id[container_stack[-1][1]],
+                name_to_id[target_name],
+                edge_type,
+                detail.decode("utf-8", errors="replace"),
             )
         )
 
-    def walk(node):
+    for node in _captured_nodes(_python_query(), tree.root_node, ("container", "call", "attribute")):
+        while container_stack and container_stack[-1][0] <= node.start_byte:
+            container_stack.pop()
+
         if node.type == "class_definition":
-            name = node_name(source, node)
+            name = _name_bytes(source, node)
             if name:
-                container_stack.append(name)
+                container_stack.append((node.end_byte, name))
             super_node = node.child_by_field_name("superclasses")
             if super_node is not None:
-                for base_name in _extract_names(node_text(source, super_node)):
+                for base_name in _extract_names(source[super_node.start_byte:super_node.end_byte]):
                     add_edge(base_name, "inherit", base_name)
 
-        if node.type == "function_definition":
-            name = node_name(source, node)
+        elif node.type == "function_definition":
+            name = _name_bytes(source, node)
             if name:
-                container_stack.append(name)
+                container_stack.append((node.end_byte, name))
 
-        if node.type == "call":
+        elif node.type == "call":
             func_node = node.child_by_field_name("function")
             if func_node is not None:
-                func_name = node_text(source, func_node)
-                target = func_name.split(".")[-1]
+                func_name = source[func_node.start_byte:func_node.end_byte]
+                target = func_name.rsplit(b".", 1)[-1]
                 add_edge(target, "call", func_name)
 
-        if node.type == "attribute":
+        elif node.type == "attribute":
+            # 属性访问数量远多于其他节点（self.x、np.array 等），先排除容器外和非本文件符号的命中
+            if not container_stack:
+                continue
             attr_node = node.child_by_field_name("attribute")
             if attr_node is not None:
-                attr_name = node_text(source, attr_node)
-                add_edge(attr_name, "use", attr_name)
+                attr_name = source[attr_node.start_byte:attr_node.end_byte]
+                if attr_name in name_to_id:
+                    add_edge(attr_name, "use", attr_name)
 
-        for child in node.children:
-            walk(child)
-
-        if node.type in {"class_definition", "function_definition"}:
-            name = node_name(source, node)
-            if name and container_stack and container_stack[-1] == name:
-                container_stack.pop()
-
-    walk(tree.root_node)
     return edges
 
 
-def _java_symbol_edges(file_path: str, symbols: List[Symbol]) -> List[SymbolDependency]:
-    source = Path(file_path).read_bytes()
-    parser = get_parser("java")
-    tree = parser.parse(source)
+def _java_symbol_edges(
+    file_path: str,
+    symbols: List[Symbol],
+    source: Optional[bytes] = None,
+    tree=None,
+) -> List[EdgeRow]:
+    if source is None:
+        source = Path(file_path).read_bytes()
+    if tree is None:
+        tree = thread_parser("java").parse(source)
 
     name_to_id = _symbol_map(symbols)
-    edges: List[SymbolDependency] = []
-    container_stack: List[str] = []
-
-    def current_container() -> str | None:
-        if not container_stack:
-            return None
-        return container_stack[-1]
+    edges: List[EdgeRow] = []
+    container_stack: List[Tuple[int, bytes]] = []
 
-    def add_edge(target_name: str, edge_type: str, detail: str) -> None:
-        src_name = current_container()
-        if not src_name or target_name not in name_to_id:
+    def add_edge(target_name: bytes, edge_type: str, detail: bytes) -> None:
+        if not container_stack or target_name not in name_to_id:
             return
         edges.append(
-            SymbolDependency(
-                src_symbol_id=name_to_id[src_name],
-                dst_symbol_id=name_to_id[target_name],
-                edge_type=edge_type,
-                detail=detail,
+            (
+                name_to_id[container_stack[-1][1]],
+                name_to_id[target_name],
+                edge_type,
+                detail.decode("utf-8", errors="replace"),
             )
         )
 
-    def walk(node):
-        if node.type in {"class_declaration", "interface_declaration", "enum_declaration"}:
-            name = node_name(source, node)
+    for node in _captured_nodes(_java_query(), tree.root_node, ("container", "call", "field_access")):
+        while container_stack and container_stack[-1][0] <= node.start_byte:
+            container_stack.pop()
+
+        if node.type in _JAVA_CLASS_TYPES:
+            name = _name_bytes(source, node)
             if name:
-                container_stack.append(name)
+                container_stack.append((node.end_byte, name))
             superclass = node.child_by_field_name("superclass")
             if superclass is not None:
-                for base_name in _extract_names(node_text(source, superclass)):
+                for base_name in _extract_names(source[superclass.start_byte:superclass.end_byte]):
                     add_edge(base_name, "inherit", base_name)
             interfaces = node.child_by_field_name("interfaces")
             if interfaces is not None:
-                for base_name in _extract_names(node_text(source, interfaces)):
+                for base_name in _extract_names(source[interfaces.start_byte:interfaces.end_byte]):
                     add_edge(base_name, "inherit", base_name)
 
-        if node.type == "method_declaration":
-            name = node_name(source, node)
+        elif node.type == "method_declaration":
+            name = _name_bytes(source, node)
             if name:
-                container_stack.append(name)
+                container_stack.append((node.end_byte, name))
 
-        if node.type == "method_invocation":
+        elif node.type == "method_invocation":
             name_node = node.child_by_field_name("name")
-            method_name = node_text(source, name_node) if name_node is not None else node_text(source, node)
-            target = method_name.split(".")[-1]
+            target_node = name_node if name_node is not None else node
+            method_name = source[target_node.start_byte:target_node.end_byte]
+            target = method_name.rsplit(b".", 1)[-1]
             add_edge(target, "call", method_name)
 
-        if node.type == "object_creation_expression":
+        elif node.type == "object_creation_expression":
             type_node = node.child_by_field_name("type")
-            type_name = node_text(source, type_node) if type_node is not None else ""
-            target = type_name.split(".")[-1]
+            type_name = source[type_node.start_byte:type_node.end_byte] if type_node is not None else b""
+            target = type_name.rsplit(b".", 1)[-1]
             add_edge(target, "call", type_name)
 
-        if node.type == "field_access":
+        elif node.type == "field_access":
             name_node = node.child_by_field_name("field")
-            field_name = node_text(source, name_node) if name_node is not None else ""
-            target = field_name.split(".")[-1]
+            field_name = source[name_node.start_byte:name_node.end_byte] if name_node is not None else b""
+            target = field_name.rsplit(b".", 1)[-1]
             add_edge(target, "use", field_name)
 
-        for child in node.children:
-            walk(child)
-
-        if node.type in {"class_declaration", "interface_declaration", "enum_declaration", "method_declaration"}:
-            name = node_name(source, node)
-            if name and container_stack and container_stack[-1] == name:
-                container_stack.pop()
-
-    walk(tree.root_node)
     return edges
 
 
-def build_symbol_dependencies(file_path: str, language: str, symbols: List[Symbol]) -> List[SymbolDependency]:
+def build_symbol_dependencies_raw(
+    file_path: str,
+    language: str,
+    symbols: List[Symbol],
+    source: Optional[bytes] = None,
+    tree=None,
+) -> List[EdgeRow]:
+    """
+    提取单个文件内的符号依赖边，以 (src_symbol_id, dst_symbol_id, edge_type, detail) 元组返回
+
+    供直接按行写库等不需要 SymbolDependency 对象的调用方使用；
+    调用方已读取文件或解析出语法树时可通过 source/tree 传入，避免重复读盘和重复解析，
+    传入 tree 时 source 必须是生成该树的同一份字节。
+    """
     if language == "python":
-        return _python_symbol_edges(file_path, symbols)
+        return _python_symbol_edges(file_path, symbols, source, tree)
     if language == "java":
-        return _java_symbol_edges(file_path, symbols)
+        return _java_symbol_edges(file_path, symbols, source, tree)
     return []
+
+
+def build_symbol_dependencies(
+    file_path: str,
+    language: str,
+    symbols: List[Symbol],
+    source: Optional[bytes] = None,
+    tree=None,
+) -> List[SymbolDependency]:
+    """提取单个文件内的符号依赖边，参数同 build_symbol_dependencies_raw"""
+    rows = build_symbol_dependencies_raw(file_path, language, symbols, source, tree)
+    return [SymbolDependency(*row) for row in rows]
+
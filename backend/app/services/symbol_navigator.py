@@ -9,11 +9,16 @@ Symbol Navigator Service - 符号导航服务
 """
 from __future__ import annotations
 
+from bisect import bisect_right
+from collections import defaultdict
 from dataclasses import dataclass
-from typing import List, Optional, Dict, Any
+from functools import lru_cache
+from itertools import count, islice
+from typing import List, Optional, Dict, Any, Iterable, Iterator, NamedTuple, Tuple
 
 from app.services.db import (
     read_symbol_by_id,
+    read_symbols_by_ids,
     read_symbols_by_repo,
     read_symbol_edges,
     read_symbols_by_file,
@@ -32,6 +37,15 @@ class SymbolLocation:
     signature: Optional[str] = None
 
 
+class SymbolCallNode(NamedTuple):
+    """调用关系中的相邻符号（调用者或被调用者），在 API 层用 _asdict() 转为 JSON 对象"""
+    id: str
+    name: str
+    kind: str
+    file_path: str
+    line_start: int
+
+
 @dataclass
 class SymbolReference:
     """符号引用"""
@@ -41,6 +55,72 @@ class SymbolReference:
     edge_type: str  # call, import, inherit, use
 
 
+# 仓库边数据版本号：invalidate_repo 为该仓库分配新版本，旧版本的缓存项不再命中，由 LRU 自然淘汰
+_VERSION_COUNTER = count(1)
+_edge_versions: Dict[str, int] = {}
+
+
+@lru_cache(maxsize=8)
+def _load_edges(
+    repo_id: str,
+    version: int,
+) -> Tuple[Tuple[Dict, ...], Dict[str, List[Dict]], Dict[str, List[Dict]]]:
+    """
+    读取仓库的符号依赖边并按目标符号和调用方符号建立索引
+
+    Returns:
+        (edges, by_dst, by_src_call)：全部边；dst_symbol_id -> 全部入边；src_symbol_id -> call 类型出边。
+        各列表保持边在数据库中的读取顺序。
+    """
+    edges = tuple(read_symbol_edges(repo_id))
+    by_dst: Dict[str, List[Dict]] = defaultdict(list)
+    by_src_call: Dict[str, List[Dict]] = defaultdict(list)
+    for edge in edges:
+        by_dst[edge.get("dst_symbol_id")].append(edge)
+        if edge.get("edge_type") == "call":
+            by_src_call[edge.get("src_symbol_id")].append(edge)
+    # 转成普通 dict，避免查询不存在的符号时向缓存中插入空列表
+    return edges, dict(by_dst), dict(by_src_call)
+
+
+def _edge_indices(repo_id: str) -> Tuple[Dict[str, List[Dict]], Dict[str, List[Dict]]]:
+    """当前版本的 (by_dst, by_src_call) 索引，同一版本内各请求共享同一份数据"""
+    _, by_dst, by_src_call = _load_edges(repo_id, _edge_versions.get(repo_id, 0))
+    return by_dst, by_src_call
+
+
+def invalidate_repo(repo_id: str) -> None:
+    """
+    仓库符号依赖边写入、删除后调用，使该仓库缓存的边索引失效
+
+    只切换该仓库的版本号，其他仓库的缓存不受影响。
+    """
+    _edge_versions[repo_id] = next(_VERSION_COUNTER)
+
+
+# 流式查询时每批解析的符号ID数，调用方提前停止迭代后不再查询剩余批次
+_RESOLVE_BATCH = 128
+
+
+def _with_symbols(
+    repo_id: str,
+    edges: Iterable[Dict],
+    key: str,
+) -> Iterator[Tuple[str, Dict, Dict]]:
+    """按批查询边上 key 字段对应的符号，依次产出 (symbol_id, edge, symbol)，跳过不存在的符号"""
+    edges = iter(edges)
+    while True:
+        batch = list(islice(edges, _RESOLVE_BATCH))
+        if not batch:
+            return
+        symbols = read_symbols_by_ids(repo_id, [edge.get(key, "") for edge in batch])
+        for edge in batch:
+            sid = edge.get(key, "")
+            symbol = symbols.get(sid)
+            if symbol:
+                yield sid, edge, symbol
+
+
 def get_symbol_definition(repo_id: str, symbol_id: str) -> Optional[SymbolLocation]:
     """
     获取符号定义位置
@@ -67,35 +147,32 @@ def get_symbol_definition(repo_id: str, symbol_id: str) -> Optional[SymbolLocati
     )
 
 
-def get_symbol_references(repo_id: str, symbol_id: str) -> List[SymbolReference]:
+def iter_symbol_references(repo_id: str, symbol_id: str) -> Iterator[SymbolReference]:
+    """逐个产出符号的引用，只需计数或前 N 条时可提前停止"""
+    by_dst, _ = _edge_indices(repo_id)
+    # 指向该符号的边（被引用）
+    for _, edge, src_symbol in _with_symbols(repo_id, by_dst.get(symbol_id, ()), "src_symbol_id"):
+        yield SymbolReference(
+            file_path=src_symbol.get("file_path", ""),
+            line=src_symbol.get("line_start", 0),
+            context=src_symbol.get("name", ""),
+            edge_type=edge.get("edge_type", "use"),
+        )
+
+
+def get_symbol_references(repo_id: str, symbol_id: str, limit: Optional[int] = None) -> List[SymbolReference]:
     """
     获取符号的所有引用
     
     Args:
         repo_id: 仓库ID
         symbol_id: 符号ID
+        limit: 最大返回数量，None 表示不限
     
     Returns:
         List[SymbolReference]: 引用列表
     """
-    edges = read_symbol_edges(repo_id)
-    if not edges:
-        return []
-    
-    references = []
-    for edge in edges:
-        # 查找指向该符号的边（被引用）
-        if edge.get("dst_symbol_id") == symbol_id:
-            src_symbol = read_symbol_by_id(repo_id, edge.get("src_symbol_id", ""))
-            if src_symbol:
-                references.append(SymbolReference(
-                    file_path=src_symbol.get("file_path", ""),
-                    line=src_symbol.get("line_start", 0),
-                    context=src_symbol.get("name", ""),
-                    edge_type=edge.get("edge_type", "use"),
-                ))
-    
-    return references
+    return list(islice(iter_symbol_references(repo_id, symbol_id), limit))
 
 
 def search_symbols(
@@ -152,68 +229,61 @@ def search_symbols(
     return results
 
 
-def get_symbol_callers(repo_id: str, symbol_id: str) -> List[Dict[str, Any]]:
+def iter_symbol_callers(repo_id: str, symbol_id: str) -> Iterator[SymbolCallNode]:
+    """逐个产出调用该符号的符号，只需计数或前 N 条时可提前停止"""
+    by_dst, _ = _edge_indices(repo_id)
+    call_edges = (edge for edge in by_dst.get(symbol_id, ()) if edge.get("edge_type") == "call")
+    for caller_id, _, caller in _with_symbols(repo_id, call_edges, "src_symbol_id"):
+        yield SymbolCallNode(
+            caller_id,
+            caller.get("name", ""),
+            caller.get("kind", ""),
+            caller.get("file_path", ""),
+            caller.get("line_start", 0),
+        )
+
+
+def get_symbol_callers(repo_id: str, symbol_id: str, limit: Optional[int] = None) -> List[SymbolCallNode]:
     """
     获取调用该符号的所有符号（调用者）
     
     Args:
         repo_id: 仓库ID
         symbol_id: 符号ID
+        limit: 最大返回数量，None 表示不限
     
     Returns:
         调用者列表
     """
-    edges = read_symbol_edges(repo_id)
-    if not edges:
-        return []
-    
-    callers = []
-    for edge in edges:
-        if edge.get("dst_symbol_id") == symbol_id and edge.get("edge_type") == "call":
-            caller_id = edge.get("src_symbol_id", "")
-            caller = read_symbol_by_id(repo_id, caller_id)
-            if caller:
-                callers.append({
-                    "id": caller_id,
-                    "name": caller.get("name", ""),
-                    "kind": caller.get("kind", ""),
-                    "file_path": caller.get("file_path", ""),
-                    "line_start": caller.get("line_start", 0),
-                })
-    
-    return callers
+    return list(islice(iter_symbol_callers(repo_id, symbol_id), limit))
+
 
+def iter_symbol_callees(repo_id: str, symbol_id: str) -> Iterator[SymbolCallNode]:
+    """逐个产出该符号调用的符号，只需计数或前 N 条时可提前停止"""
+    _, by_src_call = _edge_indices(repo_id)
+    for callee_id, _, callee in _with_symbols(repo_id, by_src_call.get(symbol_id, ()), "dst_symbol_id"):
+        yield SymbolCallNode(
+            callee_id,
+            callee.get("name", ""),
+            callee.get("kind", ""),
+            callee.get("file_path", ""),
+            callee.get("line_start", 0),
+        )
 
-def get_symbol_callees(repo_id: str, symbol_id: str) -> List[Dict[str, Any]]:
+
+def get_symbol_callees(repo_id: str, symbol_id: str, limit: Optional[int] = None) -> List[SymbolCallNode]:
     """
     获取该符号调用的所有符号（被调用者）
     
     Args:
         repo_id: 仓库ID
         symbol_id: 符号ID
+        limit: 最大返回数量，None 表示不限
     
     Returns:
         被调用者列表
     """
-    edges = read_symbol_edges(repo_id)
-    if not edges:
-        return []
-    
-    callees = []
-    for edge in edges:
-        if edge.get("src_symbol_id") == symbol_id and edge.get("edge_type") == "call":
-            callee_id = edge.get("dst_symbol_id", "")
-            callee = read_symbol_by_id(repo_id, callee_id)
-            if callee:
-                callees.append({
-                    "id": callee_id,
-                    "name": callee.get("name", ""),
-                    "kind": callee.get("kind", ""),
-                    "file_path": callee.get("file_path", ""),
-                    "line_start": callee.get("line_start", 0),
-                })
-    
-    return callees
+    return list(islice(iter_symbol_callees(repo_id, symbol_id), limit))
 
 
 def get_call_graph(repo_id: str, symbol_id: str, depth: int = 2) -> Dict[str, Any]:
@@ -228,21 +298,45 @@ def get_call_graph(repo_id: str, symbol_id: str, depth: int = 2) -> Dict[str, An
     Returns:
         调用图数据
     """
+    # 边索引只取一次，递归过程中不再经过 get_symbol_callers/get_symbol_callees
+    by_dst, by_src_call = _edge_indices(repo_id)
     visited = set()
+    # 上下游遍历会重复访问同一符号（菱形调用关系），本次调用内按 sid 缓存查询结果
+    symbol_cache: Dict[str, Optional[Dict[str, Any]]] = {}
+    
+    def get_symbol(sid: str) -> Optional[Dict[str, Any]]:
+        if sid not in symbol_cache:
+            symbol_cache[sid] = read_symbol_by_id(repo_id, sid)
+        return symbol_cache[sid]
+    
+    def prefetch(sids: List[str]) -> None:
+        # 展开一个节点前把尚未缓存的相邻符号一次查出，不存在的符号缓存为 None
+        missing = [sid for sid in sids if sid not in symbol_cache]
+        if not missing:
+            return
+        found = read_symbols_by_ids(repo_id, missing)
+        for sid in missing:
+            symbol_cache[sid] = found.get(sid)
     
     def get_upstream(sid: str, current_depth: int) -> Dict[str, Any]:
         if current_depth > depth or sid in visited:
             return {}
         visited.add(sid)
         
-        symbol = read_symbol_by_id(repo_id, sid)
+        symbol = get_symbol(sid)
         if not symbol:
             return {}
         
-        callers = get_symbol_callers(repo_id, sid)
         upstream = []
-        for caller in callers:
-            upstream.append(get_upstream(caller["id"], current_depth + 1))
+        if current_depth < depth:
+            caller_ids = [
+                edge.get("src_symbol_id", "")
+                for edge in by_dst.get(sid, ())
+                if edge.get("edge_type") == "call"
+            ]
+            prefetch(caller_ids)
+            for caller_id in caller_ids:
+                upstream.append(get_upstream(caller_id, current_depth + 1))
         
         return {
             "id": sid,
@@ -252,21 +346,21 @@ def get_call_graph(repo_id: str, symbol_id: str, depth: int = 2) -> Dict[str, An
             "callers": [u for u in upstream if u],
         }
     
-    visited.clear()
-    
     def get_downstream(sid: str, current_depth: int) -> Dict[str, Any]:
         if current_depth > depth or sid in visited:
             return {}
         visited.add(sid)
         
-        symbol = read_symbol_by_id(repo_id, sid)
+        symbol = get_symbol(sid)
         if not symbol:
             return {}
         
-        callees = get_symbol_callees(repo_id, sid)
         downstream = []
-        for callee in callees:
-            downstream.append(get_downstream(callee["id"], current_depth + 1))
+        if current_depth < depth:
+            callee_ids = [edge.get("dst_symbol_id", "") for edge in by_src_call.get(sid, ())]
+            prefetch(callee_ids)
+            for callee_id in callee_ids:
+                downstream.append(get_downstream(callee_id, current_depth + 1))
         
         return {
             "id": sid,
@@ -305,9 +399,19 @@ def get_file_outline(repo_id: str, file_path: str) -> List[Dict[str, Any]]:
     # 按行号排序
     symbols.sort(key=lambda s: s.get("line_start", 0))
     
-    # 构建层级结构
+    # 构建层级结构：类按起始行有序排列，二分定位后向前找第一个行范围覆盖该符号的类，即最内层的外围类
     outline = []
-    class_stack = []
+    class_starts: List[int] = []
+    class_items: List[Dict[str, Any]] = []
+    
+    def enclosing_class(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        i = bisect_right(class_starts, item["line_start"]) - 1
+        while i >= 0:
+            candidate = class_items[i]
+            if candidate is not item and candidate["line_end"] >= item["line_end"]:
+                return candidate
+            i -= 1
+        return None
     
     for symbol in symbols:
         kind = symbol.get("kind", "")
@@ -324,12 +428,16 @@ def get_file_outline(repo_id: str, file_path: str) -> List[Dict[str, Any]]:
         }
         
         if kind == "class":
-            outline.append(item)
-            class_stack = [item]
+            # 内部类挂到外围类下
+            parent = enclosing_class(item)
+            (parent["children"] if parent else outline).append(item)
+            class_starts.append(item["line_start"])
+            class_items.append(item)
         elif kind in ("method", "function"):
-            if container and class_stack:
+            parent = enclosing_class(item) if container else None
+            if parent:
                 # 作为类的方法
-                class_stack[-1]["children"].append(item)
+                parent["children"].append(item)
             else:
                 # 顶级函数
                 outline.append(item)
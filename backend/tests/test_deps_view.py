@@ -0,0 +1,38 @@
+﻿import pytest
+
+from app.services.db import close_conn, insert_file_edges, insert_module_nodes
+from app.services.deps_view import read_module_edges
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("CODEWIKI_DB_PATH", str(tmp_path / "codewiki.db"))
+    yield
+    close_conn()
+
+
+def test_read_module_edges_aggregates_file_edges(temp_db):
+    insert_module_nodes(
+        "repo",
+        [
+            {"module_id": "api", "file_path": "api/routes.py", "symbol_ids": []},
+            {"module_id": "api", "file_path": "api/deps.py", "symbol_ids": []},
+            {"module_id": "services", "file_path": "services/db.py", "symbol_ids": []},
+            {"module_id": "core", "file_path": "core/config.py", "symbol_ids": []},
+        ],
+    )
+    insert_file_edges(
+        "repo",
+        [
+            {"src": "api/routes.py", "dst": "services/db.py", "edge_type": "import", "detail": "db"},
+            {"src": "api/deps.py", "dst": "services/db.py", "edge_type": "import", "detail": "db"},
+            {"src": "services/db.py", "dst": "core/config.py", "edge_type": "import", "detail": "config"},
+            # 同模块内部的边和指向未分配文件的边不计入
+            {"src": "api/routes.py", "dst": "api/deps.py", "edge_type": "import", "detail": "deps"},
+            {"src": "api/routes.py", "dst": "vendor/lib.py", "edge_type": "import", "detail": "lib"},
+        ],
+    )
+
+    rows = sorted((e["src"], e["dst"], e["count"]) for e in read_module_edges("repo"))
+    assert rows == [("api", "services", 2), ("services", "core", 1)]
+    assert read_module_edges("other") == []
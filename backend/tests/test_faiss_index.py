@@ -0,0 +1,163 @@
+﻿import pytest
+
+faiss = pytest.importorskip("faiss")
+
+import numpy as np
+
+from app.services import faiss_index
+from app.services.chunking import Chunk
+from app.services.citations import Citation
+from app.services.embeddings import _hash_embedding
+
+
+@pytest.fixture
+def index_root(tmp_path, monkeypatch):
+    def index_dir(repo_id):
+        root = tmp_path / repo_id
+        root.mkdir(parents=True, exist_ok=True)
+        return root
+
+    monkeypatch.setattr(faiss_index, "_index_dir", index_dir)
+    monkeypatch.setattr(
+        faiss_index,
+        "embed_texts",
+        lambda texts, repo_id=None: [_hash_embedding(text, dim=16) for text in texts],
+    )
+    return tmp_path
+
+
+def _chunk(chunk_id, text):
+    return Chunk(id=chunk_id, text=text, citations=[Citation(f"{chunk_id}.py", None, 1, 1)])
+
+
+def _chunks():
+    return [
+        _chunk("a", "parser parser parser reads tokens"),
+        _chunk("b", "the parser builds a tree"),
+        _chunk("c", "解析器 负责 生成 语法树"),
+        _chunk("d", "unrelated storage layer"),
+    ]
+
+
+def test_tokenize_splits_cjk_per_character():
+    assert faiss_index._tokenize("解析器 Parser_v2") == ["解", "析", "器", "parser_v2"]
+
+
+def test_keyword_search_ranks_by_bm25(index_root):
+    faiss_index.build_index("bm25", _chunks())
+
+    hits = faiss_index.keyword_search("bm25", "parser", top_k=8)
+    assert [hit.chunk.id for hit in hits] == ["a", "b"]
+    assert hits[0].score > hits[1].score
+    assert hits[0].chunk.citations[0].file_path == "a.py"
+
+    assert [hit.chunk.id for hit in faiss_index.keyword_search("bm25", "语法", top_k=8)] == ["c"]
+    assert faiss_index.keyword_search("bm25", "missing", top_k=8) == []
+
+
+def test_postings_load_without_pickle(index_root):
+    faiss_index.build_index("npz", _chunks())
+
+    postings = faiss_index._load_postings("npz")
+    assert postings is not None
+    assert len(postings["doc_lens"]) == 4
+    assert set(faiss_index._bm25_scores(postings, ["parser"])) == {0, 1}
+
+    # 旧版本写入的 pickle 文件不再被加载
+    (index_root / "npz" / "postings.bin").write_bytes(b"\x80\x05N.")
+    assert faiss_index._load_postings("npz") is None
+
+
+def test_keyword_search_falls_back_without_postings(index_root):
+    faiss_index.build_index("legacy", _chunks())
+    (index_root / "legacy" / "postings.bin").unlink()
+
+    repo_index = faiss_index.load_repo_index("legacy")
+    assert repo_index.postings is None
+    hits = faiss_index.keyword_search("legacy", "parser", top_k=8)
+    assert [hit.chunk.id for hit in hits] == ["a", "b"]
+    assert hits[0].score == 3.5
+
+
+def _fake_embed(monkeypatch, dim, calls=None):
+    def embed(texts, repo_id=None):
+        if calls is not None:
+            calls.append(list(texts))
+        return [_hash_embedding(text, dim=dim) for text in texts]
+
+    monkeypatch.setattr(faiss_index, "embed_texts", embed)
+
+
+def _stored_ids(repo_id):
+    index = faiss_index.load_repo_index(repo_id).index
+    return sorted(faiss.vector_to_array(index.id_map).tolist())
+
+
+def test_incremental_build_matches_full_rebuild(index_root, monkeypatch):
+    calls = []
+    _fake_embed(monkeypatch, 16, calls)
+    chunks = _chunks()
+    faiss_index.build_index("incr", chunks)
+
+    edited = [chunks[0], _chunk("b", "the parser builds a syntax tree"), chunks[2], _chunk("e", "new chunk")]
+    calls.clear()
+    faiss_index.build_index("incr", edited)
+    # 只重新嵌入改动和新增的 chunk
+    assert calls == [["the parser builds a syntax tree", "new chunk"]]
+
+    faiss_index.build_index("full", edited)
+
+    incr = faiss_index.load_repo_index("incr")
+    full = faiss_index.load_repo_index("full")
+    assert incr.index.ntotal == full.index.ntotal == len(edited)
+    assert _stored_ids("incr") == _stored_ids("full")
+    assert _stored_ids("incr") == sorted(faiss_index._faiss_id(c.id) for c in edited)
+
+    for query in ("parser", "new chunk", "语法树"):
+        incr_hits = faiss_index.search_index("incr", query, top_k=4)
+        full_hits = faiss_index.search_index("full", query, top_k=4)
+        assert [h.chunk.id for h in incr_hits] == [h.chunk.id for h in full_hits]
+        # 复用的向量经过 float16 存盘，分数只要求近似一致
+        np.testing.assert_allclose(
+            [h.score for h in incr_hits], [h.score for h in full_hits], atol=1e-2
+        )
+
+
+def test_dimension_change_triggers_full_rebuild(index_root, monkeypatch):
+    faiss_index.build_index("dim", _chunks())
+
+    calls = []
+    _fake_embed(monkeypatch, 8, calls)
+    edited = _chunks()[:3] + [_chunk("d", "changed storage layer")]
+    faiss_index.build_index("dim", edited)
+
+    assert calls[-1] == [chunk.text for chunk in edited]
+    repo_index = faiss_index.load_repo_index("dim")
+    assert repo_index.index.d == 8
+    assert repo_index.index.ntotal == len(edited)
+    assert faiss_index.search_index("dim", "changed storage layer", top_k=1)[0].chunk.id == "d"
+
+
+def test_build_index_rejects_short_embedding_response(index_root, monkeypatch):
+    faiss_index.build_index("short", _chunks())
+    monkeypatch.setattr(faiss_index, "embed_texts", lambda texts, repo_id=None: [])
+
+    with pytest.raises(ValueError):
+        faiss_index.build_index("short", _chunks()[:3] + [_chunk("d", "changed storage layer")])
+
+
+def test_repo_index_cache_replaced_on_rebuild_and_invalidate(index_root):
+    faiss_index.build_index("cache", _chunks())
+    first = faiss_index.load_repo_index("cache")
+    assert faiss_index.load_repo_index("cache") is first
+
+    faiss_index.build_index("cache", _chunks()[:2])
+    second = faiss_index.load_repo_index("cache")
+    assert second is not first
+    assert len(second.metadata) == 2
+    # 同一仓库只保留最新的一份
+    assert faiss_index._REPO_INDEXES["cache"][1] is second
+
+    faiss_index.invalidate_repo("cache")
+    assert "cache" not in faiss_index._REPO_INDEXES
+    assert faiss_index.load_repo_index("cache") is not second
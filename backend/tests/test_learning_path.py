@@ -0,0 +1,31 @@
+﻿import numpy as np
+
+from app.services.learning_path import _topological_order
+
+
+def _order(edges, complexities, limit=30):
+    file_count = len(complexities)
+    src_ids = np.array([src for src, _ in edges], dtype=np.int64)
+    dst_ids = np.array([dst for _, dst in edges], dtype=np.int64)
+    in_counts = np.bincount(dst_ids, minlength=file_count)[:file_count].tolist()
+    sort_keys = [(complexities[i], -in_counts[i], i) for i in range(file_count)]
+    return _topological_order(file_count, src_ids, dst_ids, sort_keys, limit)
+
+
+# (src, dst)：src 依赖 dst；3 与 4 互相依赖，(1, 6) 指向范围外的文件，(2, 2) 是自环
+EDGES = [(1, 0), (2, 0), (3, 4), (4, 3), (5, 3), (5, 2), (1, 6), (2, 2)]
+COMPLEXITIES = [2, 1, 1, 1, 1, 1]
+
+
+def test_topological_order_breaks_ties_and_cycles():
+    # 0 没有依赖最先输出；1、2 复杂度相同，被依赖更多的 2 优先；
+    # 之后只剩环 3 <-> 4，取剩余依赖最少、键最小的 3 打破环
+    assert _order(EDGES, COMPLEXITIES) == [0, 2, 1, 3, 4, 5]
+
+
+def test_topological_order_stops_at_limit():
+    assert _order(EDGES, COMPLEXITIES, limit=3) == [0, 2, 1]
+
+
+def test_topological_order_prefers_lower_complexity():
+    assert _order([], [3, 1, 2]) == [1, 2, 0]
@@ -0,0 +1,49 @@
+﻿import pytest
+
+pytest.importorskip("tree_sitter_language_pack")
+
+from app.services.module_assign import _best_prefix, _build_prefix_trie, assign_files_and_symbols
+from app.services.module_tree import ModuleNode, ModuleTree
+from app.services.parsers import Symbol
+
+
+def test_best_prefix_respects_segment_boundaries():
+    trie = _build_prefix_trie(["", "app", "app/services", "lib/"])
+
+    assert _best_prefix("app/main.py", trie) == "app"
+    assert _best_prefix("app/services/db.py", trie) == "app/services"
+    # "app" 不能认领 "apple/" 下的文件
+    assert _best_prefix("apple/main.py", trie) == ""
+    assert _best_prefix("application.py", trie) == ""
+    # 带尾部斜杠的前缀按目录匹配，并原样返回
+    assert _best_prefix("lib/util.py", trie) == "lib/"
+    # 仓库根目录下的文件没有模块前缀
+    assert _best_prefix("setup.py", trie) == ""
+
+
+def test_trailing_slash_variant_keeps_longest_prefix():
+    trie = _build_prefix_trie(["pkg", "pkg/"])
+    assert _best_prefix("pkg/mod.py", trie) == "pkg/"
+
+
+def _symbol(file_path):
+    return Symbol(kind="function", name="f", file_path=file_path, line_start=1, line_end=1)
+
+
+def test_assign_files_and_symbols_uses_deepest_module(tmp_path):
+    repo_root = tmp_path.as_posix()
+    services = ModuleNode(id="app/services", name="services", path_prefix="app/services")
+    app = ModuleNode(id="app", name="app", path_prefix="app", children=[services])
+    apple = ModuleNode(id="apple", name="apple", path_prefix="apple")
+    tree = ModuleTree(root=ModuleNode(id="root", name="root", path_prefix="", children=[app, apple]))
+
+    files = {
+        "s1": f"{repo_root}/app/services/db.py",
+        "s2": f"{repo_root}/app/main.py",
+        "s3": f"{repo_root}/apple/main.py",
+        "s4": f"{repo_root}/setup.py",
+    }
+    assignments = assign_files_and_symbols(repo_root, tree, [(sid, _symbol(path)) for sid, path in files.items()])
+
+    by_symbol = {a.symbol_ids[0]: a.module_id for a in assignments}
+    assert by_symbol == {"s1": "app/services", "s2": "app", "s3": "apple", "s4": ""}
@@ -0,0 +1,47 @@
+﻿import pytest
+
+pytest.importorskip("tree_sitter_language_pack")
+
+from dataclasses import asdict
+
+from app.services import symbol_navigator
+from app.services.parsers import parse_python_file
+
+
+def test_file_outline_nests_inner_classes(tmp_path, monkeypatch):
+    code = """
+class Outer:
+    class Inner:
+        def inner_method(self):
+            pass
+
+    def after_inner(self):
+        pass
+
+
+def top_level():
+    pass
+"""
+    file_path = tmp_path / "nested.py"
+    file_path.write_text(code, encoding="utf-8")
+    symbols, _imports = parse_python_file(str(file_path))
+    rows = [{"id": sym.name, **asdict(sym)} for sym in symbols]
+    monkeypatch.setattr(symbol_navigator, "read_symbols_by_file", lambda repo_id, path: list(rows))
+
+    outline = symbol_navigator.get_file_outline("repo", str(file_path))
+
+    def shape(items):
+        return [(item["name"], item["kind"], shape(item["children"])) for item in items]
+
+    # 内部类之后的方法仍属于外围类，而不是内部类
+    assert shape(outline) == [
+        (
+            "Outer",
+            "class",
+            [
+                ("Inner", "class", [("inner_method", "function", [])]),
+                ("after_inner", "function", []),
+            ],
+        ),
+        ("top_level", "function", []),
+    ]
@@ -1,26 +1,102 @@
 ﻿from __future__ import annotations
 
 import argparse
+import json
+import os
+import shutil
+import statistics
 import time
 from pathlib import Path
+from typing import List
 
+from app.models.schemas import ModelConfig
 from app.services.analysis import run_analysis
+from app.services.auth import get_llm_config
+from app.services.codewiki_adapter import discover_files_with_codewiki
+from app.services.db import delete_repo
+from app.services.faiss_index import _index_dir, invalidate_repo as invalidate_search_index
+from app.services.learning_path import invalidate_repo as invalidate_learning_path
+from app.services.mcp_generator import invalidate_mcp_cache
+from app.services.symbol_navigator import invalidate_repo as invalidate_symbol_navigator
+
+
+def reset_repo(repo_id: str) -> None:
+    """Drop the repo's rows, caches and on-disk index so every iteration starts from the same state."""
+    delete_repo(repo_id)
+    invalidate_learning_path(repo_id)
+    invalidate_symbol_navigator(repo_id)
+    invalidate_mcp_cache(repo_id)
+    invalidate_search_index(repo_id)
+    # build_index reuses cached embeddings from disk; remove them so each run pays for embedding again
+    shutil.rmtree(_index_dir(repo_id), ignore_errors=True)
+
+
+def _model_config(args: argparse.Namespace) -> ModelConfig:
+    """CLI flags / LLM_* env vars take precedence over the admin-managed config stored in the database."""
+    config = dict(get_llm_config() or {})
+    overrides = {"base_url": args.base_url, "api_key": args.api_key, "model_name": args.model_name}
+    config.update({key: value for key, value in overrides.items() if value})
+    missing = [key for key in ("base_url", "api_key", "model_name") if not config.get(key)]
+    if missing:
+        raise SystemExit(
+            f"model config missing ({', '.join(missing)}): pass --base-url/--api-key/--model-name, "
+            "set LLM_BASE_URL/LLM_API_KEY/LLM_MODEL, or configure the LLM in the admin settings"
+        )
+    return ModelConfig(**config)
+
+
+def _run_once(repo_id: str, repo_root: Path, llm_model: ModelConfig) -> int:
+    start = time.perf_counter_ns()
+    run_analysis(repo_id, str(repo_root), include=None, exclude=None, llm_model=llm_model)
+    elapsed = time.perf_counter_ns() - start
+    reset_repo(repo_id)
+    return elapsed
+
+
+def _percentile(sorted_values: List[int], pct: float) -> int:
+    # nearest-rank percentile, stable for the small sample counts used here
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Run analysis benchmark")
     parser.add_argument("repo_path", help="Path to repository")
     parser.add_argument("--repo-id", default="bench_repo", help="Repo id")
+    parser.add_argument("--iterations", type=int, default=5, help="Timed iterations")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed warmup iterations")
+    parser.add_argument("--base-url", default=os.getenv("LLM_BASE_URL"), help="OpenAI-compatible base URL")
+    parser.add_argument("--api-key", default=os.getenv("LLM_API_KEY"), help="API key")
+    parser.add_argument("--model-name", default=os.getenv("LLM_MODEL"), help="Model identifier")
     args = parser.parse_args()
 
     repo_root = Path(args.repo_path).resolve()
     if not repo_root.exists():
         raise SystemExit(f"repo not found: {repo_root}")
+    if args.iterations < 1:
+        raise SystemExit("--iterations must be >= 1")
+    llm_model = _model_config(args)
+
+    files = discover_files_with_codewiki(str(repo_root), None, None, languages=[])
+    total_bytes = sum(os.path.getsize(f.path) for f in files)
+
+    reset_repo(args.repo_id)
+    for _ in range(args.warmup):
+        _run_once(args.repo_id, repo_root, llm_model)
+    timings = sorted(_run_once(args.repo_id, repo_root, llm_model) for _ in range(args.iterations))
 
-    start = time.time()
-    run_analysis(args.repo_id, str(repo_root), include=None, exclude=None)
-    elapsed = time.time() - start
-    print(f"analysis_seconds={elapsed:.2f}")
+    p50 = int(statistics.median(timings))
+    result = {
+        "iterations": args.iterations,
+        "warmup": args.warmup,
+        "files": len(files),
+        "bytes": total_bytes,
+        "min_ns": timings[0],
+        "p50": p50,
+        "p95": _percentile(timings, 95),
+        "bytes_per_sec": total_bytes * 1_000_000_000 / p50 if p50 else 0.0,
+    }
+    print(json.dumps(result))
 
 
 if __name__ == "__main__":